@@ -1,22 +1,53 @@
 from django_filters import rest_framework
 from django_filters.rest_framework import (BooleanFilter, CharFilter,
-                                           FilterSet,
-                                           ModelMultipleChoiceFilter)
-from recipes.models import Ingredient, Recipe, Tag
+                                           ChoiceFilter, FilterSet,
+                                           MultipleChoiceFilter)
+
+from api.tag_registry import get_tag_registry, tag_choices
+from recipes.models import Ingredient, Recipe
+
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+TAGS_MATCH_CHOICES = (
+    (TAGS_MATCH_ANY, 'Любой из тегов'),
+    (TAGS_MATCH_ALL, 'Все теги'),
+)
 
 
 class RecipeFilter(rest_framework.FilterSet):
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
+    tags = MultipleChoiceFilter(choices=tag_choices, method='filter_tags')
+    tags_match = ChoiceFilter(
+        choices=TAGS_MATCH_CHOICES, method='filter_tags_match'
     )
     is_favorited = BooleanFilter()
     is_in_shopping_cart = BooleanFilter()
+    search = CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_in_shopping_cart', 'is_favorited',)
+        fields = (
+            'author', 'tags', 'tags_match', 'is_in_shopping_cart',
+            'is_favorited', 'search',
+        )
+
+    def filter_tags(self, queryset, name, value):
+        """Слаги проверяются и переводятся в id по реестру тегов.
+
+        ?tags_match=all оставляет рецепты со всеми тегами, по умолчанию -
+        хотя бы с одним."""
+        tags_by_slug = get_tag_registry().by_slug
+        return queryset.filter_by_tags(
+            [tags_by_slug[slug]['id'] for slug in value],
+            match_all=self.form.cleaned_data.get('tags_match')
+            == TAGS_MATCH_ALL,
+        )
+
+    def filter_tags_match(self, queryset, name, value):
+        # Учитывается в filter_tags
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
 
 
 class IngredientFilter(FilterSet):
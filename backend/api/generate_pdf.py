@@ -1,48 +1,51 @@
-from django.http.response import HttpResponse
+import io
+import os
+from functools import lru_cache
+
+from django.conf import settings
 from reportlab.pdfbase import pdfmetrics, ttfonts
 from reportlab.pdfgen import canvas
 
-from recipes.models import RecipeIngredients
-
+FONT_NAME = 'Arial'
+FONT_PATH = os.path.join(settings.BASE_DIR, 'data', 'arial.ttf')
 FONT_SIZE = 14
 HEIGHT = 700
 HEIGHT_REDUCTION = 20
 INDENT_X = 100
 INDENT_Y = 750
+BOTTOM_MARGIN = 50
 STRING_INDENT_X = 80
 
 
-def generate_pdf_shopping_cart(request):
-    """Генерация списка покупок в виде PDF-файла"""
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Desposition'] = ('attachement; '
-                                       'filename=shopping_cart.pdf')
-    pdf = canvas.Canvas(response)
-    arial = ttfonts.TTFont('Arial', '../data/arial.ttf')
-    pdfmetrics.registerFont(arial)
-    pdf.setFont('Arial', FONT_SIZE)
-    ingredients = RecipeIngredients.objects.filter(
-        recipe__shopping_cart__user=request.user
-    ).values_list(
-        'ingredient__name', 'amount', 'ingredient__measurement_unit'
-    )
-    ingr_list = {}
-    for name, amount, unit in ingredients:
-        if name not in ingr_list:
-            ingr_list[name] = {'amount': amount, 'unit': unit}
-        else:
-            ingr_list[name]['amount'] += amount
+@lru_cache(maxsize=None)
+def register_font():
+    """Загрузка шрифта, выполняется один раз на процесс"""
+    pdfmetrics.registerFont(ttfonts.TTFont(FONT_NAME, FONT_PATH))
+
+
+def generate_pdf_shopping_cart(ingredients) -> bytes:
+    """Генерация списка покупок в виде PDF-файла.
+
+    ingredients - строки (название, количество, единица измерения)."""
+    register_font()
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer)
+    pdf.setFont(FONT_NAME, FONT_SIZE)
     height = HEIGHT
 
     pdf.drawString(INDENT_X, INDENT_Y, 'Список покупок')
-    for i, (name, data) in enumerate(ingr_list.items(), start=1):
+    for i, (name, amount, unit) in enumerate(ingredients, start=1):
+        if height < BOTTOM_MARGIN:
+            pdf.showPage()
+            pdf.setFont(FONT_NAME, FONT_SIZE)
+            height = INDENT_Y
         pdf.drawString(
             STRING_INDENT_X,
             height,
-            f'{i}. {name} - {data["amount"]} {data["unit"]}'
+            f'{i}. {name} - {amount} {unit}'
         )
         height -= HEIGHT_REDUCTION
     pdf.showPage()
     pdf.save()
 
-    return response
+    return buffer.getvalue()
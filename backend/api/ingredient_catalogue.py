@@ -0,0 +1,103 @@
+import gzip
+import io
+import threading
+from typing import Dict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS, get_version
+
+CATALOGUE_KEY = 'ingredient_catalogue:{}'
+IDENTITY = 'identity'
+
+_catalogue = None
+_catalogue_version = None
+_lock = threading.Lock()
+
+
+def gzip_compress(content: bytes) -> bytes:
+    """Сжатие gzip с нулевым временем в заголовке, чтобы одинаковый каталог
+    давал одинаковые байты. gzip.compress принимает mtime только с
+    Python 3.8"""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(
+        fileobj=buffer, mode='wb', compresslevel=9, mtime=0
+    ) as file:
+        file.write(content)
+    return buffer.getvalue()
+
+
+def build_catalogue() -> Dict[str, bytes]:
+    """JSON со всеми ингредиентами и его сжатый gzip вариант"""
+    content = JSONRenderer().render(list(
+        Ingredient.objects.order_by('name', 'id').values(
+            'id', 'name', 'measurement_unit'
+        )
+    ))
+    return {IDENTITY: content, 'gzip': gzip_compress(content)}
+
+
+def get_catalogue() -> Dict[str, bytes]:
+    """Каталог текущей версии ингредиентов.
+
+    Собранный каталог хранится в общем кэше, чтобы его не собирал каждый
+    процесс, и в памяти процесса до следующего изменения ингредиентов."""
+    global _catalogue, _catalogue_version
+    version = get_version(INGREDIENTS)
+    if version != _catalogue_version:
+        with _lock:
+            if version != _catalogue_version:
+                key = CATALOGUE_KEY.format(version)
+                catalogue = cache.get(key)
+                if catalogue is None:
+                    catalogue = build_catalogue()
+                    cache.set(
+                        key, catalogue,
+                        settings.INGREDIENT_CATALOGUE_TIMEOUT,
+                    )
+                _catalogue = catalogue
+                _catalogue_version = version
+    return _catalogue
+
+
+def accepted_encodings(request) -> Dict[str, float]:
+    encodings = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            encodings[coding.lower()] = quality
+    return encodings
+
+
+def catalogue_encoding(request) -> str:
+    """gzip, если клиент его принимает, иначе каталог без сжатия"""
+    encodings = accepted_encodings(request)
+    if encodings.get('gzip', encodings.get('*', 0)) > 0:
+        return 'gzip'
+    return IDENTITY
+
+
+def catalogue_response(request) -> HttpResponse:
+    """Готовый каталог ингредиентов, сжатый, если клиент это принимает"""
+    catalogue = get_catalogue()
+    encoding = catalogue_encoding(request)
+    response = HttpResponse(
+        catalogue[encoding], content_type='application/json'
+    )
+    if encoding != IDENTITY:
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = len(catalogue[encoding])
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,92 @@
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List
+
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS, get_version
+
+NGRAM_SIZE = 3
+
+
+def normalize(value: str) -> str:
+    return value.strip().lower().replace('ё', 'е')
+
+
+def ngrams(value: str):
+    return {
+        value[i:i + NGRAM_SIZE]
+        for i in range(len(value) - NGRAM_SIZE + 1)
+    }
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Сначала возвращаются совпадения по началу названия, затем по подстроке.
+    Поиск не зависит от регистра и не различает «ё» и «е»."""
+
+    def __init__(self, ingredients: List[Dict]):
+        self.ingredients = ingredients
+        self.names = [normalize(item['name']) for item in ingredients]
+        self.sorted_names = sorted(
+            (name, position) for position, name in enumerate(self.names)
+        )
+        self.postings = defaultdict(set)
+        for position, name in enumerate(self.names):
+            for ngram in ngrams(name):
+                self.postings[ngram].add(position)
+
+    def prefix_matches(self, query: str):
+        start = bisect_left(self.sorted_names, (query,))
+        for name, position in self.sorted_names[start:]:
+            if not name.startswith(query):
+                break
+            yield position
+
+    def substring_matches(self, query: str):
+        if len(query) < NGRAM_SIZE:
+            candidates = range(len(self.names))
+        else:
+            candidates = sorted(set.intersection(
+                *(self.postings.get(ngram, set()) for ngram in ngrams(query))
+            ))
+        for position in candidates:
+            if query in self.names[position]:
+                yield position
+
+    def search(self, query: str, limit: int) -> List[Dict]:
+        query = normalize(query)
+        found = []
+        seen = set()
+        for matches in (self.prefix_matches, self.substring_matches):
+            for position in matches(query):
+                if position in seen:
+                    continue
+                seen.add(position)
+                found.append(self.ingredients[position])
+                if len(found) >= limit:
+                    return found
+        return found
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_ingredient_index() -> IngredientIndex:
+    """Индекс текущей версии ингредиентов, перестраивается после изменений
+    таблицы в любом из процессов"""
+    global _index, _index_version
+    version = get_version(INGREDIENTS)
+    if version != _index_version:
+        with _lock:
+            if version != _index_version:
+                _index = IngredientIndex(list(
+                    Ingredient.objects.order_by('name', 'id').values(
+                        'id', 'name', 'measurement_unit'
+                    )
+                ))
+                _index_version = version
+    return _index
@@ -0,0 +1,285 @@
+import json
+import platform
+import random
+import tempfile
+import time
+from itertools import cycle
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.metrics import QueryStats
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+ITERATIONS = 200
+WARMUP = 10
+COLD = 20
+TOLERANCE = 0.2
+# Наибольшее число SQL-запросов на один запрос к API при пустом кэше:
+# общая часть ответа и отметки пользователя. Проверяется на запросах, перед
+# каждым из которых кэш очищается. Превышение - признак N+1 или потерянного
+# prefetch_related
+QUERY_BUDGETS = {
+    'recipes_anonymous': 6,
+    'recipes_authenticated': 9,
+    'recipes_tags': 9,
+    'recipe_detail': 8,
+    'subscriptions': 3,
+    'feed': 8,
+    'ingredient_search': 1,
+    'shopping_list_download': 1,
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Перцентиль по ближайшему рангу, values отсортированы"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(fraction * len(values) + 0.5) - 1))
+    return values[rank]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер скорости и числа SQL-запросов основных эндпоинтов API на '
+        'данных, созданных командой generate_dataset'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=ITERATIONS,
+            help='Число замеряемых запросов к каждому эндпоинту',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=WARMUP,
+            help='Число запросов для прогрева перед замером',
+        )
+        parser.add_argument(
+            '--cold', type=int, default=COLD,
+            help=(
+                'Число запросов при пустом кэше для проверки бюджетов '
+                'SQL-запросов. Перед каждым очищается отдельный кэш '
+                'замера, кэш веб-сервера не затрагивается'
+            ),
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс пользователей, созданных generate_dataset',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение для выбора рецептов и строк поиска',
+        )
+        parser.add_argument(
+            '--only', nargs='+', choices=sorted(QUERY_BUDGETS),
+            help='Замерить только указанные эндпоинты',
+        )
+        parser.add_argument(
+            '--output', help='Файл для результатов в JSON',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Результаты прошлого запуска в JSON для поиска регрессий',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=TOLERANCE,
+            help=(
+                'Допустимый рост p50 и p99 относительно прошлого запуска, '
+                'доля'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['cold'] < 1:
+            raise CommandError('Нужен хотя бы один замеряемый запрос')
+        scenarios = self.scenarios(options)
+        if options['only']:
+            scenarios = {
+                name: scenario for name, scenario in scenarios.items()
+                if name in options['only']
+            }
+        # Без DEBUG запросы не копятся в connection.queries, а тестовый
+        # клиент обращается к хосту testserver. Замер идёт на отдельном
+        # файловом кэше во временном каталоге: очистка кэша перед запросами
+        # без кэша не должна трогать версии и ответы запущенного сервера
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            CACHES={'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+                'OPTIONS': settings.CACHES['default'].get('OPTIONS', {}),
+            }},
+        ):
+            results = {
+                name: self.run(name, client, urls, options)
+                for name, (client, urls) in scenarios.items()
+            }
+        report = {
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'iterations': options['iterations'],
+            'recipes': Recipe.objects.count(),
+            'users': User.objects.count(),
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        failures = self.check_budgets(results)
+        if options['compare']:
+            failures += self.compare(results, options)
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'Проверок не пройдено: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS('Бюджеты и сравнение в норме'))
+
+    def scenarios(self, options) -> dict:
+        """Клиенты и адреса запросов для каждого эндпоинта"""
+        users = User.objects.filter(username__startswith=options['prefix'])
+        user = users.filter(
+            follower__isnull=False, shopping_cart__isnull=False
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователя с подписками и корзиной, сначала '
+                'выполните generate_dataset'
+            )
+        anonymous = APIClient()
+        authenticated = APIClient()
+        authenticated.force_authenticate(user)
+        generator = random.Random(options['seed'])
+        recipes_url = reverse('api:recipes-list')
+        recipe_ids = list(Recipe.objects.order_by('-pub_date').values_list(
+            'id', flat=True
+        )[:1000])
+        generator.shuffle(recipe_ids)
+        tags = list(Tag.objects.order_by('id').values_list('slug', flat=True))
+        names = list(Ingredient.objects.order_by('id').values_list(
+            'name', flat=True
+        )[:1000])
+        prefixes = [
+            name[:generator.randint(1, 4)] for name in generator.sample(
+                names, min(len(names), 100)
+            )
+        ]
+        return {
+            'recipes_anonymous': (anonymous, [recipes_url]),
+            'recipes_authenticated': (authenticated, [recipes_url]),
+            'recipes_tags': (authenticated, [
+                f'{recipes_url}?tags={first}&tags={second}'
+                for first, second in zip(tags, tags[1:])
+            ] or [recipes_url]),
+            'recipe_detail': (authenticated, [
+                reverse('api:recipes-detail', args=(recipe_id,))
+                for recipe_id in recipe_ids
+            ]),
+            'subscriptions': (authenticated, [
+                reverse('api:users-subscriptions') + '?recipes_limit=3'
+            ]),
+            'feed': (authenticated, [reverse('api:recipes-feed')]),
+            'ingredient_search': (authenticated, [
+                reverse('api:ingredients-list')
+                + '?' + urlencode({'name': prefix})
+                for prefix in prefixes
+            ]),
+            'shopping_list_download': (authenticated, [
+                reverse('api:recipes-download-shopping-cart') + '?format=csv'
+            ]),
+        }
+
+    def request(self, client, url):
+        query_stats = QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(query_stats):
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        duration = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{url}: код ответа {response.status_code}')
+        return duration, query_stats
+
+    def run(self, name, client, urls, options) -> dict:
+        cold_urls = urls[:options['cold']]
+        urls = cycle(urls)
+        for _ in range(options['warmup']):
+            self.request(client, next(urls))
+        durations = []
+        queries = []
+        query_durations = []
+        started = time.perf_counter()
+        for _ in range(options['iterations']):
+            duration, query_stats = self.request(client, next(urls))
+            durations.append(duration)
+            queries.append(query_stats.count)
+            query_durations.append(query_stats.duration)
+        elapsed = time.perf_counter() - started
+        durations.sort()
+        cold_queries = []
+        cold_urls = cycle(cold_urls)
+        for _ in range(options['cold']):
+            cache.clear()
+            cold_queries.append(self.request(client, next(cold_urls))[1].count)
+        result = {
+            'throughput': round(len(durations) / elapsed, 1),
+            'p50_ms': round(percentile(durations, 0.5) * 1000, 3),
+            'p99_ms': round(percentile(durations, 0.99) * 1000, 3),
+            'max_ms': round(durations[-1] * 1000, 3),
+            'queries_max': max(queries),
+            'queries_mean': round(sum(queries) / len(queries), 2),
+            'queries_cold_max': max(cold_queries),
+            'db_ms_mean': round(
+                sum(query_durations) / len(query_durations) * 1000, 3
+            ),
+            'query_budget': QUERY_BUDGETS[name],
+        }
+        self.stdout.write(
+            f'{name:<24} {result["throughput"]:>8} запр/с  '
+            f'p50 {result["p50_ms"]:>8} мс  p99 {result["p99_ms"]:>8} мс  '
+            f'SQL {result["queries_max"]}, без кэша '
+            f'{result["queries_cold_max"]}/{result["query_budget"]}'
+        )
+        return result
+
+    def check_budgets(self, results: dict) -> list:
+        return [
+            f'{name}: {result["queries_cold_max"]} SQL-запросов без кэша '
+            f'при бюджете {result["query_budget"]}'
+            for name, result in results.items()
+            if result['queries_cold_max'] > result['query_budget']
+        ]
+
+    def compare(self, results: dict, options) -> list:
+        """Регрессии относительно прошлого запуска: рост задержек больше
+        допустимого или новые SQL-запросы"""
+        with open(options['compare'], 'r', encoding='utf-8') as file:
+            previous = json.load(file)['results']
+        limit = 1 + options['tolerance']
+        failures = []
+        for name, result in results.items():
+            before = previous.get(name)
+            if before is None:
+                continue
+            for key in ('p50_ms', 'p99_ms'):
+                if result[key] > before[key] * limit:
+                    failures.append(
+                        f'{name}: {key} {result[key]} против {before[key]}'
+                    )
+            for key in ('queries_max', 'queries_cold_max'):
+                if result[key] > before.get(key, result[key]):
+                    failures.append(
+                        f'{name}: {key} {result[key]} против {before[key]}'
+                    )
+        return failures
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management import BaseCommand
+
+from api.shopping_cart import process_render_request, requested_renders
+
+INTERVAL = 2
+
+
+class Command(BaseCommand):
+    help = (
+        'Рендеринг PDF-файлов списков покупок по заявкам, созданным '
+        'запросами download_shopping_cart/?async=1'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, а проверять новые заявки',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=INTERVAL,
+            help='Пауза между проверками заявок в режиме --loop, секунды',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            rendered = self.process()
+            if rendered:
+                self.stdout.write(f'Списков покупок отрисовано: {rendered}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def process(self) -> int:
+        rendered = 0
+        for user_id, version in list(requested_renders()):
+            try:
+                rendered += process_render_request(user_id, version)
+            except Exception as error:
+                self.stderr.write(
+                    f'Пользователь {user_id}, версия {version}: {error!r}'
+                )
+        return rendered
@@ -0,0 +1,191 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.db import connection
+
+# Верхние границы корзин гистограммы времени ответа, секунды
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+UNMATCHED = ('unmatched', '')
+
+_local = threading.local()
+_registry_lock = threading.Lock()
+_thread_stats = []
+
+
+class EndpointStats:
+    """Накопленные показатели одного представления и действия"""
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'query_duration')
+
+    def __init__(self):
+        # Последняя корзина - запросы дольше всех границ (+Inf)
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_duration = 0.0
+
+    def merge(self, other: 'EndpointStats'):
+        for index, value in enumerate(other.buckets):
+            self.buckets[index] += value
+        self.count += other.count
+        self.duration += other.duration
+        self.queries += other.queries
+        self.query_duration += other.query_duration
+
+
+def _local_stats() -> dict:
+    """Показатели текущего потока.
+
+    Каждый поток пишет только в свой словарь, поэтому запись обходится без
+    блокировки. Блокировка берётся один раз при первом запросе потока,
+    чтобы зарегистрировать его словарь для сборки при выгрузке."""
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        stats = _local.stats = defaultdict(EndpointStats)
+        with _registry_lock:
+            _thread_stats.append(stats)
+    return stats
+
+
+def record(endpoint: tuple, duration: float, queries: int,
+           query_duration: float):
+    stats = _local_stats()[endpoint]
+    stats.buckets[bisect_left(DURATION_BUCKETS, duration)] += 1
+    stats.count += 1
+    stats.duration += duration
+    stats.queries += queries
+    stats.query_duration += query_duration
+
+
+def collect() -> dict:
+    """Сумма показателей всех потоков процесса"""
+    with _registry_lock:
+        thread_stats = list(_thread_stats)
+    total = defaultdict(EndpointStats)
+    for stats in thread_stats:
+        for endpoint, endpoint_stats in list(stats.items()):
+            total[endpoint].merge(endpoint_stats)
+    return total
+
+
+def reset():
+    with _registry_lock:
+        for stats in _thread_stats:
+            stats.clear()
+
+
+def get_endpoint(request) -> tuple:
+    """Имя представления DRF и действия, обработавших запрос"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name, request.method.lower()
+    actions = getattr(match.func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+    else:
+        action = request.method.lower()
+    return view_class.__name__, action
+
+
+class QueryStats:
+    """Обёртка выполнения SQL: число запросов и время в базе"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Сбор времени ответа, числа SQL-запросов и времени в базе по
+    представлениям и действиям DRF.
+
+    Показатели хранятся в памяти процесса: при нескольких процессах
+    сервера каждый отдаёт свои."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_stats = QueryStats()
+        started = time.perf_counter()
+        with connection.execute_wrapper(query_stats):
+            response = self.get_response(request)
+        record(
+            get_endpoint(request),
+            time.perf_counter() - started,
+            query_stats.count,
+            query_stats.duration,
+        )
+        return response
+
+
+def _labels(endpoint: tuple, **extra) -> str:
+    view, action = endpoint
+    labels = {'view': view, 'action': action, **extra}
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"'
+        ).replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics() -> str:
+    """Показатели в текстовом формате Prometheus"""
+    stats = sorted(collect().items())
+    lines = [
+        '# HELP foodgram_request_duration_seconds Время ответа.',
+        '# TYPE foodgram_request_duration_seconds histogram',
+    ]
+    for endpoint, endpoint_stats in stats:
+        cumulative = 0
+        bounds = [str(bound) for bound in DURATION_BUCKETS] + ['+Inf']
+        for bound, value in zip(bounds, endpoint_stats.buckets):
+            cumulative += value
+            lines.append(
+                f'foodgram_request_duration_seconds_bucket'
+                f'{{{_labels(endpoint, le=bound)}}} {cumulative}'
+            )
+        lines.append(
+            f'foodgram_request_duration_seconds_sum{{{_labels(endpoint)}}} '
+            f'{_number(endpoint_stats.duration)}'
+        )
+        lines.append(
+            f'foodgram_request_duration_seconds_count{{{_labels(endpoint)}}} '
+            f'{endpoint_stats.count}'
+        )
+    for name, attribute, help_text in (
+        ('foodgram_db_queries_total', 'queries', 'Число SQL-запросов.'),
+        (
+            'foodgram_db_query_duration_seconds_total',
+            'query_duration',
+            'Время выполнения SQL-запросов.',
+        ),
+    ):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for endpoint, endpoint_stats in stats:
+            lines.append(
+                f'{name}{{{_labels(endpoint)}}} '
+                f'{_number(getattr(endpoint_stats, attribute))}'
+            )
+    return '\n'.join(lines) + '\n'
@@ -1,13 +1,34 @@
+from hashlib import md5
 from typing import Type, Union
+from urllib.parse import urlencode
 
-from django.db import IntegrityError
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
 from rest_framework import mixins, status, viewsets
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
 from recipes.models import Cart, Favorite, Subscription
+from recipes.versions import get_version, get_versions, is_cache_shared
+
+
+def request_fingerprint(request, *parts) -> str:
+    """Хэш адреса запроса с нормализованными параметрами и частями parts"""
+    params = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    raw_key = '|'.join(str(part) for part in (
+        request.scheme, request.get_host(), request.path, params, *parts
+    ))
+    return md5(raw_key.encode()).hexdigest()
 
 
 class ListCreateDestroyViewSet(
@@ -37,7 +58,8 @@ class CreateAndDeleteRelatedMixin():
         }
         if self.request.method == 'POST':
             try:
-                model.objects.create(**kwargs)
+                with transaction.atomic():
+                    model.objects.create(**kwargs)
             except IntegrityError:
                 raise ValidationError({'errors': create_failed_message})
             context = self.get_serializer_context()
@@ -52,8 +74,118 @@ class CreateAndDeleteRelatedMixin():
             klass_obj = model.objects.filter(**kwargs).first()
             if klass_obj is None:
                 raise ValidationError({'errors': delete_failed_message})
-            klass_obj.delete()
+            with transaction.atomic():
+                klass_obj.delete()
             response = Response(status=status.HTTP_204_NO_CONTENT)
         else:
             raise ValidationError({'errors': 'Неверный метод запроса'})
         return response
+
+
+class SharedResponseCacheMixin():
+    """Общий для всех пользователей кэш ответов list и retrieve.
+
+    В кэш попадает анонимное представление ответа, ключ строится по пути,
+    нормализованным параметрам запроса и версиям данных из
+    response_cache_versions. Авторизованным пользователям личные данные
+    накладываются поверх общего тела в personalize_response_data. С кэшем
+    в памяти процесса ответы не кэшируются: версии в нём не видят изменений
+    из других процессов."""
+    response_cache_versions = ()
+    response_cache_bypass_params = ()
+
+    def get_response_cache_key(self, request):
+        versions = get_versions(*self.response_cache_versions)
+        return f'response:{request_fingerprint(request, versions)}'
+
+    def is_response_cacheable(self, request):
+        return (
+            bool(self.response_cache_versions)
+            and is_cache_shared()
+            and not any(
+                param in request.query_params
+                for param in self.response_cache_bypass_params
+            )
+        )
+
+    def get_shared_response_data(self, handler, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            user = request.user
+            request.user = AnonymousUser()
+            try:
+                data = handler(request, *args, **kwargs).data
+            finally:
+                request.user = user
+            cache.set(key, data, settings.RESPONSE_CACHE_TIMEOUT)
+        return data
+
+    def personalize_response_data(self, data):
+        return data
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_response_cacheable(request):
+            return handler(request, *args, **kwargs)
+        data = self.get_shared_response_data(handler, request, *args, **kwargs)
+        if request.user.is_authenticated:
+            data = self.personalize_response_data(data)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+
+class ConditionalGetMixin():
+    """Ответы 304 Not Modified для list и retrieve без сериализации.
+
+    ETag строится по адресу запроса и версиям данных conditional_versions,
+    для авторизованного пользователя добавляются его личные версии
+    conditional_user_versions. Last-Modified не отдаётся: с точностью до
+    секунды он не отличает два изменения в одну секунду. С кэшем в памяти
+    процесса условные ответы отключены, как и SharedResponseCacheMixin."""
+    conditional_versions = ()
+    conditional_user_versions = ()
+
+    def get_data_versions(self, request):
+        versions = get_versions(*self.conditional_versions)
+        if request.user.is_authenticated:
+            versions += tuple(
+                get_version(name, request.user.pk)
+                for name in self.conditional_user_versions
+            )
+        return versions
+
+    def get_etag(self, request) -> str:
+        return request_fingerprint(
+            request, request.user.pk, self.get_data_versions(request)
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if not self.conditional_versions or not is_cache_shared():
+            return handler(request, *args, **kwargs)
+        etag = quote_etag(self.get_etag(request))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+        if self.conditional_user_versions:
+            patch_vary_headers(response, ('Authorization', 'Cookie'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
@@ -0,0 +1,13 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Выбор первого парсера и рендерера без учёта заголовков и ?format=.
+
+    Нужен представлениям, которые сами формируют ответ в запрошенном
+    формате, чтобы параметр format не перехватывался DRF."""
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
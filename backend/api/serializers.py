@@ -1,32 +1,59 @@
 import base64
+import binascii
+import io
 import re
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile,
+                                            UploadedFile)
 from django.db import transaction
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
+from PIL import Image
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.tag_registry import get_tag_registry
+from recipes.images import get_variants
 from recipes.models import (Cart, Favorite, Ingredient, Recipe,
-                            RecipeIngredients,
+                            RecipeIngredients, ShoppingListItem,
                             Subscription, Tag)
 from users.models import User
 
 MIN = 1
 MAX = 32767
+BASE64_CHUNK_SIZE = 64 * 1024
+AMOUNT_ERROR_MESSAGE = (
+    f'Количество ингредиента должно быть не менее {MIN} и не более {MAX}'
+)
 
 
 class CustomUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
+    def get_subscribed_author_ids(self, user):
+        """Авторы, на которых подписан пользователь запроса.
+
+        Загружаются одним запросом и сохраняются в общем контексте, поэтому
+        вложенные сериализаторы автора не обращаются к базе на каждую
+        запись."""
+        if 'subscribed_author_ids' not in self.context:
+            self.context['subscribed_author_ids'] = set(
+                Subscription.objects.filter(
+                    user=user
+                ).values_list('author_id', flat=True)
+            )
+        return self.context['subscribed_author_ids']
+
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        return Subscription.objects.filter(
-            user=request.user,
-            author=obj
-        ).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.pk in self.get_subscribed_author_ids(request.user)
 
     class Meta:
         model = User
@@ -70,13 +97,81 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         read_only_fields = ('role',)
 
 
+def decode_base64_file(payload: str, name: str, content_type: str,
+                       size: int) -> UploadedFile:
+    """Декодирование base64 порциями, как при обычной загрузке файла.
+
+    Небольшие файлы декодируются в память, большие - во временный файл на
+    диске, поэтому строка base64 и декодированные данные целиком
+    одновременно в памяти не находятся."""
+    if re.search(r'\s', payload):
+        payload = re.sub(r'\s', '', payload)
+    if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        decoded = TemporaryUploadedFile(name, content_type, size, None)
+    else:
+        decoded = InMemoryUploadedFile(
+            io.BytesIO(), None, name, content_type, size, None
+        )
+    for start in range(0, len(payload), BASE64_CHUNK_SIZE):
+        decoded.write(base64.b64decode(
+            payload[start:start + BASE64_CHUNK_SIZE], validate=True
+        ))
+    decoded.seek(0)
+    return decoded
+
+
 class Base64ImageField(serializers.ImageField):
+    """Изображение в виде data URI или загруженного файла.
+
+    Размер проверяется до декодирования, ширина и высота - по заголовку
+    изображения до его полной проверки. Имя файлу даёт хранилище по хэшу
+    содержимого."""
+    default_error_messages = {
+        'invalid_base64': 'Некорректное изображение в формате base64.',
+        'too_large': 'Размер изображения больше {max_size} байт.',
+        'too_wide': 'Ширина и высота изображения не больше {max_dimension}.',
+    }
+
+    def decode(self, data: str) -> UploadedFile:
+        header, _, payload = data.partition(',')
+        content_type, _, encoding = header[len('data:'):].partition(';')
+        if encoding != 'base64':
+            self.fail('invalid_base64')
+        size = len(payload) * 3 // 4 - payload[-2:].count('=')
+        self.check_size(size)
+        ext = re.sub(r'[^a-z0-9]', '', content_type.split('/')[-1].lower())
+        try:
+            return decode_base64_file(
+                payload, f'image.{ext or "img"}', content_type, size
+            )
+        except binascii.Error:
+            self.fail('invalid_base64')
+
+    def check_size(self, size: int):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+
+    def check_dimensions(self, image: UploadedFile):
+        max_dimension = settings.RECIPE_IMAGE_MAX_DIMENSION
+        try:
+            width, height = Image.open(image).size
+        except Image.DecompressionBombError:
+            self.fail('too_wide', max_dimension=max_dimension)
+        except (OSError, ValueError):
+            # Некорректное изображение отклонит проверка ImageField
+            return
+        finally:
+            image.seek(0)
+        if width > max_dimension or height > max_dimension:
+            self.fail('too_wide', max_dimension=max_dimension)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            data = self.decode(data)
+        elif getattr(data, 'size', None) is not None:
+            self.check_size(data.size)
+        if hasattr(data, 'seek'):
+            self.check_dimensions(data)
         return super().to_internal_value(data)
 
 
@@ -89,6 +184,15 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 class TagSerializer(serializers.ModelSerializer):
 
+    def to_representation(self, instance):
+        """Данные тега берутся из реестра, общего на весь запрос"""
+        if 'tag_registry' not in self.context:
+            self.context['tag_registry'] = get_tag_registry()
+        tag = self.context['tag_registry'].by_id.get(instance.pk)
+        if tag is None:
+            return super().to_representation(instance)
+        return dict(tag)
+
     class Meta:
         model = Tag
         fields = '__all__'
@@ -106,10 +210,36 @@ class RecipeIngredientGetSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount',)
 
 
+class ImageVariantsField(serializers.Field):
+    """Адреса уменьшенных копий изображения рецепта, пустой список, пока
+    копии не готовы"""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image or not recipe.image_variants_ready:
+            return []
+        request = self.context.get('request')
+
+        def url(name):
+            url = default_storage.url(name)
+            return request.build_absolute_uri(url) if request else url
+
+        return [
+            {'width': width, 'url': url(name), 'webp': url(webp_name)}
+            for width, name, webp_name in get_variants(recipe.image.name)
+        ]
+
+
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
 
 
 class RecipeListSerializer(serializers.ModelSerializer):
@@ -121,6 +251,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     def get_is_favorited(self, obj):
         if self.context['request'].user.is_anonymous:
@@ -143,18 +274,28 @@ class RecipeListSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
 
 
 class IngredientCreateInRecipeSerializer(serializers.ModelSerializer):
+    """Строка ингредиента в рецепте.
+
+    Ингредиенты всех строк проверяются одним запросом в
+    RecipeCreateUpdateSerializer.validate_ingredients."""
     recipe = serializers.PrimaryKeyRelatedField(read_only=True)
-    id = serializers.PrimaryKeyRelatedField(
-        source='ingredient',
-        queryset=Ingredient.objects.all()
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField(
+        write_only=True,
+        min_value=MIN,
+        max_value=MAX,
+        error_messages={
+            'min_value': AMOUNT_ERROR_MESSAGE,
+            'max_value': AMOUNT_ERROR_MESSAGE,
+        },
     )
-    amount = serializers.IntegerField(write_only=True, min_value=1)
 
     class Meta:
         model = RecipeIngredients
@@ -199,28 +340,38 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(required=False)
 
     def validate_ingredients(self, data):
-        """Валидация ингердиентов в рецепте"""
-        ingredients = self.initial_data.get('ingredients')
-        if not ingredients:
+        """Валидация ингредиентов в рецепте.
+
+        Ингредиенты загружаются одним запросом, повторы ищутся по множеству,
+        ошибки возвращаются для каждой строки отдельно."""
+        if not data:
             raise serializers.ValidationError(
                 [{'errors': ['Добавьте хотя бы один ингредиент']}]
             )
-        valid_list = []
-        for ingredient in ingredients:
-            ingr_id = ingredient.get('id')
-            if ingr_id in valid_list:
-                raise serializers.ValidationError(
-                    [{'errors': ['Ингредиенты не должны повторяться']}]
-                )
-            valid_list.append(ingredient.get('id'))
-            if not MIN <= int(ingredient['amount']) <= MAX:
-                raise serializers.ValidationError(
-                    [{'errors': [
-                        f'Количество ингредиента должно быть не менее {MIN}'
-                        f' и меньше {MAX}'
-                    ]}]
-                )
-        return data
+        found = Ingredient.objects.in_bulk(
+            {ingredient['id'] for ingredient in data}
+        )
+        errors = []
+        seen = set()
+        for ingredient in data:
+            if ingredient['id'] not in found:
+                errors.append({'id': [
+                    f'Ингредиента с id {ingredient["id"]} не существует'
+                ]})
+            elif ingredient['id'] in seen:
+                errors.append({'id': ['Ингредиенты не должны повторяться']})
+            else:
+                errors.append({})
+            seen.add(ingredient['id'])
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [
+            {
+                'ingredient': found[ingredient['id']],
+                'amount': ingredient['amount'],
+            }
+            for ingredient in data
+        ]
 
     def bulk_create_ingredients(self, recipe, ingredients):
         create_ingredients = [
@@ -244,17 +395,59 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         self.bulk_create_ingredients(recipe, ingredients)
         return recipe
 
-    def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        instance.tags.clear()
-
-        ingredients = validated_data.pop('ingredients')
-        instance.tags.set(validated_data.pop('tags', instance.tags))
+    def update_ingredients(self, recipe, ingredients):
+        """Изменение ингредиентов рецепта по разнице с текущими строками.
+
+        Удаляются, добавляются и обновляются только изменившиеся строки,
+        итоги списков покупок пересчитываются только по ним."""
+        current = {
+            row.ingredient_id: row
+            for row in RecipeIngredients.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient['ingredient'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        changed = [
+            row for ingredient_id, row in current.items()
+            if ingredient_id in amounts
+            and row.amount != amounts[ingredient_id]
+        ]
+        for row in changed:
+            row.amount = amounts[row.ingredient_id]
+        added = [
+            RecipeIngredients(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        if removed:
+            RecipeIngredients.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        RecipeIngredients.objects.bulk_update(changed, ('amount',))
+        RecipeIngredients.objects.bulk_create(added)
+        refreshed = [row.ingredient_id for row in changed + added]
+        if refreshed:
+            ShoppingListItem.objects.refresh_for_recipe(recipe.pk, refreshed)
 
-        self.bulk_create_ingredients(instance, ingredients)
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        if 'ingredients' in validated_data:
+            self.update_ingredients(
+                instance, validated_data.pop('ingredients')
+            )
+        if 'tags' in validated_data:
+            # set() сам удаляет и добавляет только изменившиеся теги
+            instance.tags.set(validated_data.pop('tags'))
         return super().update(instance, validated_data)
 
     def to_representation(self, obj):
+        prefetch_related_objects(
+            [obj], 'tags', 'recipe_ingredient__ingredient'
+        )
         return RecipeSerializer(
             obj, context={'request': self.context.get('request')}
         ).data
@@ -295,23 +488,23 @@ class FavoriteSerializer(serializers.ModelSerializer):
 
 class SubscriptionGetSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     update = serializers.ModelSerializer.update
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()[:int(recipes_limit)]
+        previews = self.context.get('recipe_previews')
+        if previews is not None:
+            recipes = previews.get(obj.pk, [])
+        else:
+            recipes = obj.recipes.all()[:self.context.get(
+                'recipes_limit', settings.DEFAULT_RECIPES_LIMIT
+            )]
         return RecipeMinifiedSerializer(
             recipes,
             many=True,
             context=self.context
         ).data
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     class Meta:
         model = User
         fields = (
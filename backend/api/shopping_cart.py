@@ -0,0 +1,207 @@
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from api.generate_pdf import generate_pdf_shopping_cart
+from recipes.models import ShoppingListItem
+from recipes.versions import SHOPPING_LIST, get_version
+
+ARTIFACTS_DIR = 'shopping_lists'
+EXPORT_CHUNK_SIZE = 500
+FILENAME = 'shopping_cart'
+PDF_EXTENSION = '.pdf'
+REQUEST_EXTENSION = '.requested'
+RENDER_STATUS_KEY = 'shopping_list_render:{}:{}'
+ABSENT = 'absent'
+FAILED = 'failed'
+PENDING = 'pending'
+READY = 'ready'
+
+
+def user_dir(user_id: int) -> str:
+    return f'{ARTIFACTS_DIR}/{user_id}'
+
+
+def artifact_name(user_id: int, version: int) -> str:
+    return f'{user_dir(user_id)}/{version}{PDF_EXTENSION}'
+
+
+def request_name(user_id: int, version: int) -> str:
+    return f'{user_dir(user_id)}/{version}{REQUEST_EXTENSION}'
+
+
+def get_shopping_list(user_id: int):
+    return ShoppingListItem.objects.filter(
+        user_id=user_id
+    ).order_by('ingredient__name').values_list(
+        'ingredient__name', 'amount', 'ingredient__measurement_unit'
+    )
+
+
+def render_shopping_cart(user_id: int, version: int) -> str:
+    """Рендеринг PDF-файла версии version и удаление устаревших файлов и
+    заявок пользователя. Возвращает имя файла в хранилище"""
+    name = artifact_name(user_id, version)
+    if not default_storage.exists(name):
+        content = generate_pdf_shopping_cart(list(get_shopping_list(user_id)))
+        default_storage.save(name, ContentFile(content))
+    _, files = default_storage.listdir(user_dir(user_id))
+    for filename in files:
+        stale = f'{user_dir(user_id)}/{filename}'
+        if stale != name:
+            default_storage.delete(stale)
+    return name
+
+
+def request_render(user_id: int, version: int) -> None:
+    """Заявка на рендеринг для команды render_shopping_lists. Заявка - файл
+    в том же хранилище, поэтому её видят все процессы"""
+    name = request_name(user_id, version)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(b''))
+
+
+def requested_renders():
+    """Пользователи и версии из заявок на рендеринг"""
+    if not default_storage.exists(ARTIFACTS_DIR):
+        return
+    directories, _ = default_storage.listdir(ARTIFACTS_DIR)
+    for directory in directories:
+        if not directory.isdigit():
+            continue
+        _, files = default_storage.listdir(f'{ARTIFACTS_DIR}/{directory}')
+        for filename in files:
+            version, extension = os.path.splitext(filename)
+            if extension == REQUEST_EXTENSION and version.isdigit():
+                yield int(directory), int(version)
+
+
+def process_render_request(user_id: int, version: int) -> bool:
+    """Выполнение заявки. Заявка на устаревшую версию корзины просто
+    удаляется: клиент увидит статус absent и запросит файл заново"""
+    if version != get_version(SHOPPING_LIST, user_id):
+        default_storage.delete(request_name(user_id, version))
+        return False
+    try:
+        render_shopping_cart(user_id, version)
+    except Exception:
+        cache.set(
+            RENDER_STATUS_KEY.format(user_id, version),
+            FAILED,
+            settings.SHOPPING_LIST_STATUS_TIMEOUT,
+        )
+        default_storage.delete(request_name(user_id, version))
+        raise
+    return True
+
+
+def file_response(name: str):
+    return FileResponse(
+        default_storage.open(name),
+        as_attachment=True,
+        filename=f'{FILENAME}.pdf',
+        content_type='application/pdf',
+    )
+
+
+def get_shopping_cart_pdf(request):
+    """Выдача PDF-файла со списком покупок.
+
+    Готовый файл текущей версии корзины отдаётся из хранилища, иначе файл
+    рендерится в запросе. С ?async=1 вместо ожидания рендеринга создаётся
+    заявка для команды render_shopping_lists и возвращается 202, а
+    готовность проверяется через статус."""
+    user_id = request.user.pk
+    version = get_version(SHOPPING_LIST, user_id)
+    name = artifact_name(user_id, version)
+    if default_storage.exists(name):
+        return file_response(name)
+    if request.query_params.get('async') in ('1', 'true'):
+        request_render(user_id, version)
+        return JsonResponse(
+            {'status': PENDING}, status=status.HTTP_202_ACCEPTED
+        )
+    return file_response(render_shopping_cart(user_id, version))
+
+
+def get_render_status(user_id: int) -> dict:
+    """Состояние PDF-файла для текущей версии корзины"""
+    version = get_version(SHOPPING_LIST, user_id)
+    if default_storage.exists(artifact_name(user_id, version)):
+        render_status = READY
+    elif default_storage.exists(request_name(user_id, version)):
+        render_status = PENDING
+    else:
+        render_status = cache.get(
+            RENDER_STATUS_KEY.format(user_id, version), ABSENT
+        )
+    return {'status': render_status, 'version': version}
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи"""
+    def write(self, value):
+        return value
+
+
+def csv_lines(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for row in ingredients:
+        yield writer.writerow(row)
+
+
+def text_lines(ingredients):
+    yield 'Список покупок\n'
+    for i, (name, amount, unit) in enumerate(ingredients, start=1):
+        yield f'{i}. {name} - {amount} {unit}\n'
+
+
+def json_chunks(ingredients):
+    yield '['
+    for i, (name, amount, unit) in enumerate(ingredients):
+        item = json.dumps(
+            {'name': name, 'amount': amount, 'measurement_unit': unit},
+            ensure_ascii=False,
+        )
+        yield f',{item}' if i else item
+    yield ']'
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', csv_lines),
+    'txt': ('text/plain', text_lines),
+    'json': ('application/json', json_chunks),
+}
+
+
+def export_shopping_cart(request, export_format: str):
+    """Выгрузка списка покупок в выбранном формате.
+
+    Текстовые форматы отдаются потоком, строки читаются из базы курсором
+    порциями, поэтому расход памяти не зависит от размера списка."""
+    if export_format == 'pdf':
+        return get_shopping_cart_pdf(request)
+    if export_format not in EXPORT_FORMATS:
+        raise ValidationError({'format': [
+            f'Доступные форматы: pdf, {", ".join(EXPORT_FORMATS)}'
+        ]})
+    content_type, generate = EXPORT_FORMATS[export_format]
+    ingredients = get_shopping_list(request.user.pk).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    response = StreamingHttpResponse(
+        generate(ingredients), content_type=f'{content_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename={FILENAME}.{export_format}'
+    )
+    return response
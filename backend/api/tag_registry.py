@@ -0,0 +1,55 @@
+import threading
+from typing import Dict, List
+
+from recipes.models import Tag
+from recipes.versions import TAGS, get_version, is_cache_shared
+
+
+class TagRegistry:
+    """Теги в памяти процесса с поиском по id и слагу.
+
+    Теги меняются редко, поэтому эндпоинт тегов, фильтр рецептов и вложенная
+    сериализация тегов читают их отсюда, а не из базы данных."""
+
+    def __init__(self, tags: List[Dict]):
+        self.tags = tags
+        self.by_id = {tag['id']: tag for tag in tags}
+        self.by_slug = {tag['slug']: tag for tag in tags}
+
+    def choices(self):
+        return [(tag['slug'], tag['name']) for tag in self.tags]
+
+
+_registry = None
+_registry_version = None
+_lock = threading.Lock()
+
+
+def load_registry() -> TagRegistry:
+    return TagRegistry(list(
+        Tag.objects.order_by('name').values('id', 'name', 'color', 'slug')
+    ))
+
+
+def get_tag_registry() -> TagRegistry:
+    """Реестр текущей версии тегов, перестраивается после изменения тегов
+    в любом из процессов.
+
+    Версия тегов хранится в общем кэше. Если кэш в памяти процесса, смена
+    версии в другом процессе не видна, и теги читаются из базы данных при
+    каждом обращении: их немного, а устаревший реестр жил бы до
+    перезапуска."""
+    global _registry, _registry_version
+    if not is_cache_shared():
+        return load_registry()
+    version = get_version(TAGS)
+    if version != _registry_version:
+        with _lock:
+            if version != _registry_version:
+                _registry = load_registry()
+                _registry_version = version
+    return _registry
+
+
+def tag_choices():
+    return get_tag_registry().choices()
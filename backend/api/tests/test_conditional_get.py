@@ -0,0 +1,70 @@
+import pytest
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Tag
+
+
+def revalidate(client, url, response):
+    return client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+
+# Версии данных меняются после фиксации транзакции
+@pytest.mark.django_db(transaction=True)
+class TestConditionalGet:
+    def test_unchanged_tags_are_not_modified(self, anonymous_client, tag):
+        url = '/api/tags/'
+        response = anonymous_client.get(url)
+        assert response.status_code == 200
+        cached = revalidate(anonymous_client, url, response)
+        assert cached.status_code == 304
+        assert not cached.content
+        assert cached['ETag'] == response['ETag']
+
+    def test_tag_change_invalidates_etag(self, anonymous_client, tag):
+        url = '/api/tags/'
+        response = anonymous_client.get(url)
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        fresh = revalidate(anonymous_client, url, response)
+        assert fresh.status_code == 200
+        assert len(fresh.json()) == 2
+        assert fresh['ETag'] != response['ETag']
+
+    def test_recipe_change_invalidates_etag(
+        self, anonymous_client, make_recipe
+    ):
+        recipe = make_recipe({})
+        url = f'/api/recipes/{recipe.pk}/'
+        response = anonymous_client.get(url)
+        assert revalidate(anonymous_client, url, response).status_code == 304
+        recipe.name = 'Новое название'
+        recipe.save()
+        fresh = revalidate(anonymous_client, url, response)
+        assert fresh.status_code == 200
+        assert fresh.json()['name'] == 'Новое название'
+
+    def test_user_relations_change_only_own_etag(
+        self, user, make_user, user_client, make_recipe
+    ):
+        other_client = APIClient()
+        other_client.force_authenticate(make_user('other'))
+        recipe = make_recipe({})
+        url = f'/api/recipes/{recipe.pk}/'
+        own = user_client.get(url)
+        other = other_client.get(url)
+        assert own['ETag'] != other['ETag']
+        assert 'Authorization' in own['Vary']
+        Favorite.objects.create(user=user, recipe=recipe)
+        fresh = revalidate(user_client, url, own)
+        assert fresh.status_code == 200
+        assert fresh.json()['is_favorited'] is True
+        assert revalidate(other_client, url, other).status_code == 304
+
+    def test_process_local_cache_disables_etags(
+        self, settings, anonymous_client, tag
+    ):
+        settings.CACHES = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+        response = anonymous_client.get('/api/tags/')
+        assert response.status_code == 200
+        assert not response.has_header('ETag')
@@ -0,0 +1,62 @@
+import gzip
+import json
+
+import pytest
+
+from api.ingredient_catalogue import gzip_compress
+from recipes.models import Ingredient
+
+URL = '/api/ingredients/'
+
+
+def names(content):
+    return [item['name'] for item in json.loads(content)]
+
+
+@pytest.mark.django_db
+class TestIngredientCatalogue:
+    def test_identity_catalogue_lists_all_ingredients(
+        self, anonymous_client, ingredients
+    ):
+        response = anonymous_client.get(URL)
+        assert response.status_code == 200
+        assert not response.has_header('Content-Encoding')
+        assert names(response.content) == ['молоко', 'мука', 'яйца']
+        assert 'Accept-Encoding' in response['Vary']
+
+    def test_gzip_catalogue_has_own_etag(
+        self, anonymous_client, ingredients
+    ):
+        plain = anonymous_client.get(URL)
+        response = anonymous_client.get(
+            URL, HTTP_ACCEPT_ENCODING='br, gzip;q=0.8'
+        )
+        assert response['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.content) == plain.content
+        assert response['ETag'] == plain['ETag'][:-1] + '-gzip"'
+        cached = anonymous_client.get(
+            URL,
+            HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        assert cached.status_code == 304
+
+    def test_refused_gzip_is_not_sent(self, anonymous_client, ingredients):
+        response = anonymous_client.get(URL, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        assert not response.has_header('Content-Encoding')
+
+    def test_empty_name_returns_catalogue(
+        self, anonymous_client, ingredients
+    ):
+        response = anonymous_client.get(URL, {'name': ''})
+        assert names(response.content) == ['молоко', 'мука', 'яйца']
+
+    def test_gzip_is_reproducible(self):
+        assert gzip_compress(b'[]') == gzip_compress(b'[]')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_catalogue_is_rebuilt_after_change(anonymous_client, ingredients):
+    assert len(json.loads(anonymous_client.get(URL).content)) == 3
+    Ingredient.objects.create(name='соль', measurement_unit='г')
+    assert 'соль' in names(anonymous_client.get(URL).content)
@@ -0,0 +1,51 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredient
+
+URL = '/api/ingredients/'
+
+
+def search(client, name, **params):
+    response = client.get(URL, {'name': name, **params})
+    assert response.status_code == 200
+    return [item['name'] for item in response.json()]
+
+
+@pytest.fixture
+def catalogue(db):
+    Ingredient.objects.bulk_create(
+        Ingredient(name=name, measurement_unit='г')
+        for name in (
+            'сахар', 'сахарная пудра', 'ванильный сахар', 'ёжевика',
+            'Соль', 'морская соль',
+        )
+    )
+
+
+@pytest.mark.django_db
+class TestIngredientSearch:
+    def test_prefix_matches_come_first(self, anonymous_client, catalogue):
+        assert search(anonymous_client, 'сахар') == [
+            'сахар', 'сахарная пудра', 'ванильный сахар',
+        ]
+
+    def test_search_ignores_case_and_yo(self, anonymous_client, catalogue):
+        assert search(anonymous_client, 'СОЛ') == ['Соль', 'морская соль']
+        assert search(anonymous_client, 'еж') == ['ёжевика']
+
+    def test_limit_caps_results(self, anonymous_client, catalogue):
+        assert len(search(anonymous_client, 'с', limit=2)) == 2
+
+    def test_invalid_limit_is_rejected(self, anonymous_client, catalogue):
+        response = anonymous_client.get(URL, {'name': 'с', 'limit': 'x'})
+        assert response.status_code == 400
+
+    def test_indexed_search_skips_database(
+        self, anonymous_client, catalogue
+    ):
+        search(anonymous_client, 'сахар')
+        with CaptureQueriesContext(connection) as queries:
+            search(anonymous_client, 'соль')
+        assert len(queries) == 0
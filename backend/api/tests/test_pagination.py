@@ -0,0 +1,56 @@
+import pytest
+
+URL = '/api/recipes/'
+
+
+def page_ids(response):
+    assert response.status_code == 200
+    return [recipe['id'] for recipe in response.json()['results']]
+
+
+@pytest.mark.django_db
+class TestCursorPagination:
+    def test_pages_cover_recipes_newest_first(
+        self, anonymous_client, make_recipe
+    ):
+        recipes = [make_recipe({}) for _ in range(5)]
+        ids = []
+        response = anonymous_client.get(URL, {'cursor': '', 'limit': 2})
+        while True:
+            ids.extend(page_ids(response))
+            data = response.json()
+            assert 'count' not in data
+            if data['next'] is None:
+                break
+            response = anonymous_client.get(data['next'])
+        assert ids == [recipe.pk for recipe in reversed(recipes)]
+
+    def test_new_recipe_does_not_shift_next_page(
+        self, anonymous_client, make_recipe
+    ):
+        recipes = [make_recipe({}) for _ in range(4)]
+        first = anonymous_client.get(URL, {'cursor': '', 'limit': 2})
+        make_recipe({})
+        second = anonymous_client.get(first.json()['next'])
+        assert page_ids(second) == [recipes[1].pk, recipes[0].pk]
+
+    def test_invalid_cursor_is_not_found(self, anonymous_client):
+        response = anonymous_client.get(URL, {'cursor': 'not-a-cursor'})
+        assert response.status_code == 404
+
+    def test_page_number_pagination_by_default(
+        self, anonymous_client, make_recipe
+    ):
+        make_recipe({})
+        data = anonymous_client.get(URL).json()
+        assert data['count'] == 1
+
+    def test_search_keeps_page_number_pagination(
+        self, anonymous_client, make_recipe
+    ):
+        make_recipe({}, name='Блины')
+        make_recipe({}, name='Омлет')
+        response = anonymous_client.get(
+            URL, {'cursor': '', 'search': 'Блины'}
+        )
+        assert response.json()['count'] == 1
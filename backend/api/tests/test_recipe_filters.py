@@ -0,0 +1,43 @@
+import pytest
+
+from recipes.models import Tag
+
+URL = '/api/recipes/'
+
+
+def result_names(client, params):
+    response = client.get(URL, params)
+    assert response.status_code == 200
+    return sorted(recipe['name'] for recipe in response.json()['results'])
+
+
+@pytest.fixture
+def tagged_recipes(tag, make_recipe):
+    lunch = Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+    make_recipe({}, name='Только завтрак')
+    make_recipe({}, name='Завтрак и обед').tags.add(lunch)
+    make_recipe({}, name='Только обед').tags.set([lunch])
+
+
+@pytest.mark.django_db
+class TestTagFilter:
+    def test_any_tag_matches_by_default(
+        self, anonymous_client, tagged_recipes
+    ):
+        assert result_names(
+            anonymous_client, {'tags': ['breakfast', 'lunch']}
+        ) == ['Завтрак и обед', 'Только завтрак', 'Только обед']
+
+    def test_all_tags_must_match(self, anonymous_client, tagged_recipes):
+        assert result_names(anonymous_client, {
+            'tags': ['breakfast', 'lunch'], 'tags_match': 'all',
+        }) == ['Завтрак и обед']
+
+    def test_single_tag(self, anonymous_client, tagged_recipes):
+        assert result_names(anonymous_client, {'tags': 'lunch'}) == [
+            'Завтрак и обед', 'Только обед',
+        ]
+
+    def test_unknown_tag_is_rejected(self, anonymous_client, tagged_recipes):
+        response = anonymous_client.get(URL, {'tags': 'dinner'})
+        assert response.status_code == 400
@@ -0,0 +1,37 @@
+import pytest
+from django.db import connection
+
+from recipes.models import Recipe
+
+URL = '/api/recipes/'
+
+
+def search(client, text):
+    response = client.get(URL, {'search': text})
+    assert response.status_code == 200
+    return [recipe['name'] for recipe in response.json()['results']]
+
+
+@pytest.mark.django_db
+class TestRecipeSearch:
+    def test_name_and_text_are_searched(self, anonymous_client, make_recipe):
+        make_recipe({}, name='Pancakes')
+        recipe = make_recipe({}, name='Омлет')
+        recipe.text = 'Подавать с pancakes'
+        recipe.save()
+        make_recipe({}, name='Суп')
+        assert sorted(search(anonymous_client, 'pancakes')) == [
+            'Pancakes', 'Омлет',
+        ]
+
+    @pytest.mark.skipif(
+        connection.vendor != 'postgresql',
+        reason='ранжирование есть только в PostgreSQL',
+    )
+    def test_results_are_ranked(self, anonymous_client, make_recipe):
+        make_recipe({}, name='Суп')
+        Recipe.objects.filter(name='Суп').update(text='блины')
+        make_recipe({}, name='Блины с блинами')
+        assert search(anonymous_client, 'блины') == [
+            'Блины с блинами', 'Суп',
+        ]
@@ -0,0 +1,58 @@
+import pytest
+
+from recipes.models import Recipe, RecipeIngredients, ShoppingListItem
+
+
+def rows(recipe_id):
+    return {
+        row.ingredient_id: (row.pk, row.amount)
+        for row in RecipeIngredients.objects.filter(recipe_id=recipe_id)
+    }
+
+
+@pytest.mark.django_db
+class TestRecipeUpdate:
+    def test_update_touches_only_changed_rows(
+        self, author_client, user, ingredients, recipe_payload, add_to_cart
+    ):
+        flour, milk, eggs = ingredients
+        response = author_client.post(
+            '/api/recipes/',
+            recipe_payload({flour: 200, milk: 100}),
+            format='json',
+        )
+        assert response.status_code == 201
+        recipe_id = response.json()['id']
+        before = rows(recipe_id)
+        add_to_cart(Recipe.objects.get(pk=recipe_id))
+        response = author_client.patch(
+            f'/api/recipes/{recipe_id}/',
+            recipe_payload({flour: 250, eggs: 2}),
+            format='json',
+        )
+        assert response.status_code == 200
+        after = rows(recipe_id)
+        assert after.keys() == {flour.pk, eggs.pk}
+        assert after[flour.pk] == (before[flour.pk][0], 250)
+        assert dict(ShoppingListItem.objects.filter(
+            user=user
+        ).values_list('ingredient_id', 'amount')) == {
+            flour.pk: 250, eggs.pk: 2,
+        }
+
+    def test_same_ingredients_keep_rows(
+        self, author_client, ingredients, recipe_payload
+    ):
+        flour, milk, _ = ingredients
+        data = recipe_payload({flour: 200, milk: 100})
+        recipe_id = author_client.post(
+            '/api/recipes/', data, format='json'
+        ).json()['id']
+        before = rows(recipe_id)
+        response = author_client.patch(
+            f'/api/recipes/{recipe_id}/',
+            {**data, 'name': 'Тонкие блины'},
+            format='json',
+        )
+        assert response.json()['name'] == 'Тонкие блины'
+        assert rows(recipe_id) == before
@@ -0,0 +1,55 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredient
+
+
+@pytest.mark.django_db
+class TestIngredientValidation:
+    def test_errors_are_reported_per_row(
+        self, author_client, ingredients, recipe_payload
+    ):
+        flour = ingredients[0]
+        data = recipe_payload({flour: 1})
+        data['ingredients'] += [
+            {'id': 0, 'amount': 1}, {'id': flour.pk, 'amount': 2},
+        ]
+        response = author_client.post('/api/recipes/', data, format='json')
+        assert response.status_code == 400
+        errors = response.json()['ingredients']
+        assert errors[0] == {}
+        assert 'id' in errors[1] and 'id' in errors[2]
+
+    def test_empty_ingredients_are_rejected(
+        self, author_client, recipe_payload
+    ):
+        response = author_client.post(
+            '/api/recipes/', recipe_payload({}), format='json'
+        )
+        assert response.status_code == 400
+
+    def test_ingredients_are_loaded_in_one_query(
+        self, author_client, recipe_payload
+    ):
+        many = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(20)
+        )
+        data = recipe_payload({})
+        data['ingredients'] = [
+            {'id': ingredient.pk, 'amount': 1}
+            for ingredient in Ingredient.objects.filter(
+                name__in=[ingredient.name for ingredient in many]
+            )
+        ] + [{'id': 0, 'amount': 1}]
+        with CaptureQueriesContext(connection) as queries:
+            response = author_client.post(
+                '/api/recipes/', data, format='json'
+            )
+        assert response.status_code == 400
+        ingredient_queries = [
+            query for query in queries.captured_queries
+            if 'recipes_ingredient' in query['sql']
+        ]
+        assert len(ingredient_queries) == 1
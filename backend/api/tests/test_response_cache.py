@@ -0,0 +1,53 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Favorite
+
+URL = '/api/recipes/'
+
+
+def first_recipe(client, **params):
+    response = client.get(URL, params)
+    assert response.status_code == 200
+    return response.json()['results'][0]
+
+
+@pytest.mark.django_db
+class TestSharedResponseCache:
+    def test_cached_page_skips_recipe_queries(
+        self, anonymous_client, make_recipe
+    ):
+        make_recipe({})
+        first_recipe(anonymous_client)
+        with CaptureQueriesContext(connection) as queries:
+            first_recipe(anonymous_client)
+        assert len(queries) == 0
+
+    def test_personal_flags_are_overlaid(
+        self, user, make_user, user_client, anonymous_client, author,
+        make_recipe, subscribe, add_to_cart
+    ):
+        recipe = make_recipe({})
+        Favorite.objects.create(user=user, recipe=recipe)
+        add_to_cart(recipe)
+        subscribe(user, author)
+        first_recipe(anonymous_client)
+        own = first_recipe(user_client)
+        assert own['is_favorited'] is True
+        assert own['is_in_shopping_cart'] is True
+        assert own['author']['is_subscribed'] is True
+        anonymous = first_recipe(anonymous_client)
+        assert anonymous['is_favorited'] is False
+        assert anonymous['author']['is_subscribed'] is False
+
+    def test_flag_filters_bypass_cache(
+        self, user, user_client, make_recipe
+    ):
+        favorite = make_recipe({}, name='Избранный')
+        make_recipe({}, name='Другой')
+        Favorite.objects.create(user=user, recipe=favorite)
+        response = user_client.get(URL, {'is_favorited': 1})
+        assert [
+            recipe['name'] for recipe in response.json()['results']
+        ] == ['Избранный']
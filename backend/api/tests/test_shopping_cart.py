@@ -0,0 +1,55 @@
+import pytest
+from django.core.management import call_command
+
+URL = '/api/recipes/download_shopping_cart/'
+STATUS_URL = '/api/recipes/download_shopping_cart/status/'
+
+
+def content(response):
+    return b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+class TestShoppingCartDownload:
+    def test_csv_export_lists_totals(
+        self, user_client, ingredients, make_recipe, add_to_cart
+    ):
+        flour, milk, _ = ingredients
+        add_to_cart(make_recipe({flour: 200, milk: 100}))
+        add_to_cart(make_recipe({flour: 50}))
+        response = user_client.get(URL, {'format': 'csv'})
+        assert response.status_code == 200
+        assert content(response).decode().splitlines() == [
+            'name,amount,measurement_unit',
+            'молоко,100,мл',
+            'мука,250,г',
+        ]
+
+    def test_unknown_format_is_rejected(self, user_client):
+        assert user_client.get(URL, {'format': 'xls'}).status_code == 400
+
+    def test_pdf_is_rendered_in_request(
+        self, user_client, ingredients, make_recipe, add_to_cart
+    ):
+        add_to_cart(make_recipe({ingredients[0]: 200}))
+        response = user_client.get(URL)
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/pdf'
+        assert content(response).startswith(b'%PDF')
+        assert user_client.get(STATUS_URL).json()['status'] == 'ready'
+
+    def test_async_pdf_is_rendered_by_command(
+        self, user_client, ingredients, make_recipe, add_to_cart
+    ):
+        add_to_cart(make_recipe({ingredients[0]: 200}))
+        response = user_client.get(URL, {'async': 1})
+        assert response.status_code == 202
+        assert user_client.get(STATUS_URL).json()['status'] == 'pending'
+        call_command('render_shopping_lists')
+        assert user_client.get(STATUS_URL).json()['status'] == 'ready'
+        response = user_client.get(URL, {'async': 1})
+        assert response.status_code == 200
+        assert content(response).startswith(b'%PDF')
+
+    def test_anonymous_is_rejected(self, anonymous_client):
+        assert anonymous_client.get(URL).status_code == 401
@@ -0,0 +1,47 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+URL = '/api/users/subscriptions/'
+
+
+def subscriptions(client, **params):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(URL, params)
+    assert response.status_code == 200
+    return response.json()['results'], len(queries)
+
+
+@pytest.fixture
+def follow(user, make_user, make_recipe, subscribe):
+    def follow(count):
+        """Подписка на count новых авторов с двумя рецептами у каждого"""
+        for _ in range(count):
+            author = make_user(f'author{follow.created}')
+            follow.created += 1
+            make_recipe({}, recipe_author=author)
+            make_recipe({}, recipe_author=author)
+            subscribe(user, author)
+    follow.created = 0
+    return follow
+
+
+@pytest.mark.django_db
+class TestSubscriptions:
+    def test_query_count_does_not_grow_with_authors(
+        self, user_client, follow
+    ):
+        follow(1)
+        _, few = subscriptions(user_client)
+        follow(4)
+        results, many = subscriptions(user_client)
+        assert len(results) == 5
+        assert many == few
+
+    def test_recipes_limit_and_flags(self, user_client, follow):
+        follow(2)
+        results, _ = subscriptions(user_client, recipes_limit=1)
+        for author in results:
+            assert author['is_subscribed'] is True
+            assert author['recipes_count'] == 2
+            assert len(author['recipes']) == 1
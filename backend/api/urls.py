@@ -2,7 +2,8 @@ from django.urls import include, path
 from rest_framework import routers
 
 from api.views import (CartViewset, CustomUserViewSet, FavoriteViewSet,
-                       IngredientViewSet, RecipeViewSet, TagViewSet)
+                       IngredientViewSet, MetricsView, RecipeViewSet,
+                       TagViewSet)
 
 
 app_name = 'api'
@@ -21,6 +22,7 @@ router.register(
 router.register(r'cart', CartViewset, basename='shopping_cart')
 
 urlpatterns = [
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,26 +1,44 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import BooleanField, Exists, OuterRef, Prefetch, Value
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
 from django_filters import rest_framework as filters
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from djoser.permissions import CurrentUserOrAdminOrReadOnly
 
 from api.filters import IngredientFilter, RecipeFilter
-from api.generate_pdf import generate_pdf_shopping_cart
-from api.mixins import CreateAndDeleteRelatedMixin, ListCreateDestroyViewSet
-from api.permissions import IsAdminUserOrReadOnly
+from api.ingredient_catalogue import (IDENTITY, catalogue_encoding,
+                                      catalogue_response)
+from api.ingredient_index import get_ingredient_index
+from api.metrics import render_metrics
+from api.mixins import (ConditionalGetMixin, CreateAndDeleteRelatedMixin,
+                        ListCreateDestroyViewSet, SharedResponseCacheMixin)
+from api.negotiation import IgnoreClientContentNegotiation
+from api.permissions import IsAdmin, IsAdminUserOrReadOnly
 from api.serializers import (CartSerializer, CustomUserCreateSerializer,
                              FavoriteSerializer,
                              IngredientSerializer,
                              RecipeCreateUpdateSerializer,
                              RecipeListSerializer, RecipeMinifiedSerializer,
                              SubscriptionGetSerializer, TagSerializer)
+from api.shopping_cart import export_shopping_cart, get_render_status
+from api.tag_registry import get_tag_registry
 
 from recipes.models import (Cart, Ingredient, Favorite, Recipe,
                             Subscription, Tag)
-from recipes.pagination import RecipePagination
+from recipes.pagination import (FeedPagination, RecipeCursorPagination,
+                                RecipePagination)
+from recipes.versions import (INGREDIENTS, RECIPES, TAGS, USER_RELATIONS,
+                              USERS)
 from users.models import User
 
 
@@ -34,6 +52,16 @@ class CustomUserViewSet(UserViewSet, CreateAndDeleteRelatedMixin):
             self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_anonymous:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(
+                user=self.request.user, author=OuterRef('pk')
+            )
+        ))
+
     def destroy(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
@@ -54,43 +82,117 @@ class CustomUserViewSet(UserViewSet, CreateAndDeleteRelatedMixin):
             field_to_create_or_delete_name='author'
         )
 
+    def get_recipes_limit(self):
+        try:
+            recipes_limit = int(self.request.query_params.get(
+                'recipes_limit', settings.DEFAULT_RECIPES_LIMIT
+            ))
+        except ValueError:
+            raise ValidationError({'recipes_limit': ['Ожидается целое число']})
+        return max(0, recipes_limit)
+
     @action(methods=['GET'], detail=False)
     def subscriptions(self, request):
+        """Подписки пользователя с превью рецептов авторов.
+
+        Превью для всей страницы выбираются одним оконным запросом, число
+        рецептов автора хранится в его записи."""
+        recipes_limit = self.get_recipes_limit()
         queryset = User.objects.filter(
             following__user=self.request.user
-        ).all()
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        )
         page = self.paginate_queryset(queryset)
+        recipe_previews = defaultdict(list)
+        for recipe in Recipe.objects.latest_for_authors(
+            [author.pk for author in page], recipes_limit
+        ):
+            recipe_previews[recipe.author_id].append(recipe)
         serializer = SubscriptionGetSerializer(
             page,
-            context={'request': request},
+            context={
+                'request': request,
+                'recipes_limit': recipes_limit,
+                'recipe_previews': recipe_previews,
+            },
             many=True
         )
         return self.get_paginated_response(serializer.data)
 
 
-class RecipeViewSet(viewsets.ModelViewSet, CreateAndDeleteRelatedMixin):
+class RecipeViewSet(
+    ConditionalGetMixin,
+    SharedResponseCacheMixin,
+    viewsets.ModelViewSet,
+    CreateAndDeleteRelatedMixin,
+):
     """Вьюсет для рецептов"""
     http_method_name = ['GET', 'POST', 'PATCH', 'DELETE']
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = RecipePagination
     permission_classes = (CurrentUserOrAdminOrReadOnly,)
+    response_cache_versions = (RECIPES, TAGS, INGREDIENTS, USERS)
+    conditional_versions = response_cache_versions
+    conditional_user_versions = (USER_RELATIONS,)
+    response_cache_bypass_params = ('is_favorited', 'is_in_shopping_cart')
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация включается параметром ?cursor=. При поиске
+        остаётся постраничная: курсор по (pub_date, id) сбил бы порядок по
+        релевантности"""
+        if not hasattr(self, '_paginator'):
+            if self.action == 'feed':
+                self._paginator = FeedPagination()
+            elif (
+                RecipeCursorPagination.cursor_query_param
+                in self.request.query_params
+                and not self.request.query_params.get('search')
+            ):
+                self._paginator = RecipeCursorPagination()
+        return super().paginator
 
     def get_queryset(self):
-        print(self.request.user.is_anonymous)
+        # Данные тегов подставляются из реестра, из базы нужны только id
+        tags = Prefetch('tags', queryset=Tag.objects.only('id'))
         if self.request.user.is_anonymous:
             return (
                 Recipe.objects
                 .select_related('author')
-                .prefetch_related('tags', 'ingredients')
+                .prefetch_related(tags, 'recipe_ingredient__ingredient')
             )
         return (
             Recipe.objects
             .add_user_annotations(user_id=self.request.user.pk)
             .select_related('author')
-            .prefetch_related('tags', 'ingredients')
+            .prefetch_related(tags, 'recipe_ingredient__ingredient')
         )
 
+    def personalize_response_data(self, data):
+        """Флаги избранного, корзины и подписки поверх общего кэша"""
+        recipes = data.get('results', [data])
+        user = self.request.user
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        author_ids = {recipe['author']['id'] for recipe in recipes}
+        favorited = set(Favorite.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+        in_shopping_cart = set(Cart.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True))
+        subscribed = set(Subscription.objects.filter(
+            user=user, author_id__in=author_ids
+        ).values_list('author_id', flat=True))
+        for recipe in recipes:
+            recipe['is_favorited'] = recipe['id'] in favorited
+            recipe['is_in_shopping_cart'] = recipe['id'] in in_shopping_cart
+            recipe['author']['is_subscribed'] = (
+                recipe['author']['id'] in subscribed
+            )
+        return data
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH'):
             return RecipeCreateUpdateSerializer
@@ -107,7 +209,9 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateAndDeleteRelatedMixin):
         if self.action in (
                 'shopping_cart',
                 'favorite',
-                'download_shopping_cart'
+                'feed',
+                'download_shopping_cart',
+                'download_shopping_cart_status',
         ):
             return [IsAuthenticated()]
         if self.action in (
@@ -132,10 +236,34 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateAndDeleteRelatedMixin):
             field_to_create_or_delete_name='recipe'
         )
 
-    @action(detail=False, methods=['GET'])
+    @action(
+        detail=False,
+        methods=['GET'],
+        content_negotiation_class=IgnoreClientContentNegotiation,
+    )
     def download_shopping_cart(self, request):
-        """Вызов выгрузки PDF-файла со списком покупок"""
-        return generate_pdf_shopping_cart(request)
+        """Выгрузка списка покупок: ?format=pdf (по умолчанию), csv, txt
+        или json"""
+        return export_shopping_cart(
+            request, request.query_params.get('format', 'pdf')
+        )
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        url_path='download_shopping_cart/status',
+    )
+    def download_shopping_cart_status(self, request):
+        """Готовность PDF-файла со списком покупок"""
+        return Response(get_render_status(request.user.pk))
+
+    @action(detail=False, methods=['GET'])
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан пользователь,
+        от новых к старым. Следующая страница - по ссылке next"""
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(methods=['POST', 'DELETE'], detail=True)
     def favorite(self, request, pk=None):
@@ -148,12 +276,34 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateAndDeleteRelatedMixin):
         )
 
 
-class TagViewSet(ListCreateDestroyViewSet):
+class TagViewSet(ConditionalGetMixin, ListCreateDestroyViewSet):
     """Вьюсет для тэгов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminUserOrReadOnly,)
     pagination_class = None
+    conditional_versions = (TAGS,)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.list_registered, request)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.retrieve_registered, request, *args, **kwargs
+        )
+
+    def list_registered(self, request):
+        """Список тегов из реестра в памяти процесса"""
+        return Response(get_tag_registry().tags)
+
+    def retrieve_registered(self, request, pk=None):
+        try:
+            tag = get_tag_registry().by_id.get(int(pk))
+        except ValueError:
+            tag = None
+        if tag is None:
+            raise NotFound
+        return Response(tag)
 
     def perform_create(self, serializer):
         serializer.save(
@@ -165,18 +315,69 @@ class TagViewSet(ListCreateDestroyViewSet):
         serializer.delete()
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Получение доступных тэгов."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    conditional_versions = (INGREDIENTS,)
+
+    def get_search_limit(self):
+        try:
+            limit = int(self.request.query_params.get(
+                'limit', settings.INGREDIENT_SEARCH_LIMIT
+            ))
+        except ValueError:
+            raise ValidationError({'limit': ['Ожидается целое число']})
+        return max(1, min(limit, settings.INGREDIENT_SEARCH_MAX_LIMIT))
+
+    def is_catalogue_request(self, request):
+        return (
+            self.action == 'list'
+            and not request.query_params.get('name')
+            and request.accepted_renderer.format == 'json'
+        )
+
+    def get_etag(self, request):
+        """У каждого сжатия каталога своё тело, поэтому и свой ETag"""
+        etag = super().get_etag(request)
+        if self.is_catalogue_request(request):
+            encoding = catalogue_encoding(request)
+            if encoding != IDENTITY:
+                etag = f'{etag}-{encoding}'
+        return etag
+
+    def list(self, request, *args, **kwargs):
+        response = self.conditional_response(
+            self.search_or_list, request, *args, **kwargs
+        )
+        if self.is_catalogue_request(request):
+            patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def search_or_list(self, request, *args, **kwargs):
+        """Поиск по ?name= выполняется по индексу в памяти, без запросов
+        к базе данных. Полный список отдаётся заранее собранным и сжатым
+        JSON, в том числе при пустом ?name=."""
+        name = request.query_params.get('name')
+        if not name:
+            if self.is_catalogue_request(request):
+                return catalogue_response(request)
+            return super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs
+            )
+        return Response(
+            get_ingredient_index().search(name, self.get_search_limit())
+        )
 
 
 class FavoriteViewSet(RecipeViewSet):
     """Возвращает все избранные рецепты пользователя, сделавшего запрос"""
     serializer_class = FavoriteSerializer
+    response_cache_versions = ()
+    conditional_versions = ()
 
     def get_queryset(self):
         return Recipe.objects.filter(
@@ -188,9 +389,21 @@ class FavoriteViewSet(RecipeViewSet):
 class CartViewset(RecipeViewSet):
     """Возвращает список покупок пользователя"""
     serializer_class = CartSerializer
+    response_cache_versions = ()
+    conditional_versions = ()
 
     def get_queryset(self):
         return Recipe.objects.filter(
             is_in_shopping_cart=True,
             recipe__shopping_cart__user=self.request.user
         ).all()
+
+
+class MetricsView(APIView):
+    """Показатели запросов процесса в текстовом формате Prometheus"""
+    permission_classes = (IsAdmin,)
+
+    def get(self, request):
+        return HttpResponse(
+            render_metrics(), content_type='text/plain; version=0.0.4'
+        )
@@ -0,0 +1,149 @@
+import pytest
+from rest_framework.test import APIClient
+
+from recipes.models import (Cart, Ingredient, Recipe, RecipeIngredients,
+                            Subscription, Tag)
+from users.models import User
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAA'
+    'AggCByxOyYQAAAABJRU5ErkJggg=='
+)
+
+
+@pytest.fixture(autouse=True)
+def private_storage(settings, tmp_path):
+    """Отдельные кэш и каталог файлов для каждого теста"""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path / 'cache'),
+        }
+    }
+    settings.MEDIA_ROOT = str(tmp_path / 'media')
+
+
+@pytest.fixture(autouse=True)
+def foreground_tasks(monkeypatch):
+    """Фоновые задачи лент выполняются сразу, уменьшенные копии
+    изображений не создаются"""
+    monkeypatch.setattr(
+        'recipes.feed.submit', lambda function, *args: function(*args)
+    )
+    monkeypatch.setattr(
+        'recipes.signals.schedule_variants', lambda *args: None
+    )
+
+
+@pytest.fixture
+def make_user(db):
+    def make_user(username):
+        return User.objects.create_user(
+            email=f'{username}@example.com',
+            username=username,
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password',
+        )
+    return make_user
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user('user')
+
+
+@pytest.fixture
+def author(make_user):
+    return make_user('author')
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def author_client(author):
+    # CurrentUserOrAdminOrReadOnly из djoser разрешает изменять рецепты
+    # только персоналу
+    author.is_staff = True
+    author.save()
+    client = APIClient()
+    client.force_authenticate(author)
+    return client
+
+
+@pytest.fixture
+def anonymous_client():
+    return APIClient()
+
+
+@pytest.fixture
+def tag(db):
+    return Tag.objects.create(
+        name='Завтрак', color='#E26C2D', slug='breakfast'
+    )
+
+
+@pytest.fixture
+def ingredients(db):
+    return [
+        Ingredient.objects.create(name=name, measurement_unit=unit)
+        for name, unit in (('мука', 'г'), ('молоко', 'мл'), ('яйца', 'шт'))
+    ]
+
+
+@pytest.fixture
+def make_recipe(author, tag):
+    def make_recipe(amounts, name='Рецепт', recipe_author=None):
+        """Рецепт с ингредиентами из словаря {ингредиент: количество}"""
+        recipe = Recipe.objects.create(
+            author=recipe_author or author,
+            name=name,
+            text='Описание',
+            cooking_time=10,
+        )
+        recipe.tags.add(tag)
+        for ingredient, amount in amounts.items():
+            RecipeIngredients.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+    return make_recipe
+
+
+@pytest.fixture
+def add_to_cart(user):
+    def add_to_cart(recipe, cart_user=None):
+        return Cart.objects.create(user=cart_user or user, recipe=recipe)
+    return add_to_cart
+
+
+@pytest.fixture
+def subscribe():
+    def subscribe(follower, author):
+        return Subscription.objects.create(user=follower, author=author)
+    return subscribe
+
+
+@pytest.fixture
+def recipe_payload(tag):
+    def recipe_payload(amounts, **fields):
+        """Данные для создания рецепта через API"""
+        return {
+            'name': 'Блины',
+            'text': 'Описание',
+            'cooking_time': 30,
+            'image': IMAGE,
+            'tags': [tag.pk],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient, amount in amounts.items()
+            ],
+            **fields,
+        }
+    return recipe_payload
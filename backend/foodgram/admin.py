@@ -1,18 +1,120 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from recipes.models import (Cart, Favorite, Ingredient, Recipe,
                             RecipeIngredients, Subscription, Tag)
 from users.models import User
 
+# С какого числа строк список в админке показывает оценку планировщика
+# PostgreSQL вместо точного COUNT
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def estimate_count(queryset) -> int:
+    """Оценка числа строк запроса по плану PostgreSQL, без его выполнения"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, которому для больших таблиц хватает оценки числа строк"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if connections[queryset.db].vendor == 'postgresql':
+            estimate = estimate_count(queryset)
+            if estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений"""
+    template = 'foodgram/admin/input_filter.html'
+    placeholder = ''
+
+    def lookups(self, request, model_admin):
+        # Без вариантов Django не показывает фильтр
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice['query_parts'] = [
+            (name, value)
+            for name, value in changelist.get_filters_params().items()
+            if name != self.parameter_name
+        ]
+        yield all_choice
+
+
+class RelatedInputFilter(InputFilter):
+    """Фильтр по связанной записи: число ищется по первичному ключу,
+    текст - по началу индексированного поля search_field"""
+    search_field = None
+
+    def queryset(self, request, queryset):
+        value = (self.value() or '').strip()
+        if not value:
+            return None
+        if value.isdigit():
+            return queryset.filter(**{f'{self.parameter_name}_id': value})
+        return queryset.filter(**{
+            f'{self.parameter_name}__{self.search_field}__startswith': value
+        })
+
+
+class UserFilter(RelatedInputFilter):
+    title = 'пользователю'
+    parameter_name = 'user'
+    search_field = 'email'
+    placeholder = 'id или эл.почта'
+
+
+class AuthorFilter(UserFilter):
+    title = 'автору'
+    parameter_name = 'author'
+
+
+class RecipeFilter(RelatedInputFilter):
+    title = 'рецепту'
+    parameter_name = 'recipe'
+    search_field = 'name'
+    placeholder = 'id или название'
+
+
+class IngredientFilter(RecipeFilter):
+    title = 'ингредиенту'
+    parameter_name = 'ingredient'
+
+
+class BaseAdmin(admin.ModelAdmin):
+    """Списки без полного COUNT и без выборки всех связанных записей"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if search_term.isdigit():
+            return queryset.filter(pk=search_term), False
+        return super().get_search_results(request, queryset, search_term)
+
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredients
     min_num = 1
     extra = 0
+    raw_id_fields = ('ingredient',)
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(BaseAdmin):
     list_display = (
         'id',
         'username',
@@ -20,73 +122,88 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
         'role',
+        'recipes_count',
+        'followers_count',
     )
-    search_fields = ('id', 'username', 'email', 'first_name', 'last_name', )
-    list_filter = ('username', 'email',)
-    empty_value_display = '-пусто-'
+    search_fields = ('username__startswith', 'email__startswith', )
+    list_filter = ('role', 'is_staff', )
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(BaseAdmin):
     list_display = ('id', 'name', 'measurement_unit', )
-    search_fields = ('id', 'name', 'measurement_unit', )
-    list_filter = ('name', 'measurement_unit', )
-    empty_value_display = '-пусто-'
+    search_fields = ('name__startswith', )
+    list_filter = ('measurement_unit', )
 
 
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(BaseAdmin):
     list_display = ('id', 'name', 'color', 'slug', )
-    search_fields = ('id', 'name', 'color', 'slug', )
+    search_fields = ('name', 'color', 'slug', )
     list_filter = ('name', 'color', 'slug', )
-    empty_value_display = '-пусто-'
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BaseAdmin):
 
     def added_to_favorites_amount(self, obj):
-        return Subscription.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     added_to_favorites_amount.short_description = (
         'Количество добавлений в избранное'
     )
+    added_to_favorites_amount.admin_order_field = 'favorites_count'
 
-    list_display = ('id', 'name', 'author', 'cooking_time', )
-    search_fields = ('id', 'name', 'author', 'tags', 'cooking_time', )
-    list_filter = ('name', 'author', 'tags', )
-    empty_value_display = '-пусто-'
+    list_display = (
+        'id', 'name', 'author', 'cooking_time', 'added_to_favorites_amount',
+    )
+    list_select_related = ('author', )
+    search_fields = ('name', )
+    list_filter = (AuthorFilter, 'tags', )
+    raw_id_fields = ('author', )
     inlines = (RecipeIngredientInline,)
-    empty_value_display = '-пусто-'
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по названию и описанию через полнотекстовый индекс"""
+        search_term = search_term.strip()
+        if not search_term or search_term.isdigit():
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        return queryset.search(search_term), False
 
 
 @admin.register(RecipeIngredients)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(BaseAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount', )
-    search_fields = ('id', 'recipe', 'ingredient', 'amount', )
-    list_filter = ('recipe', 'ingredient', 'amount', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('recipe', 'ingredient', )
+    search_fields = ('recipe__name__startswith', )
+    list_filter = (RecipeFilter, IngredientFilter, )
+    raw_id_fields = ('recipe', 'ingredient', )
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(BaseAdmin):
     list_display = ('id', 'user', 'recipe', )
-    search_fields = ('id', 'user', 'recipe', )
-    list_filter = ('user', 'recipe', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'recipe', )
+    search_fields = ('user__email__startswith', )
+    list_filter = (UserFilter, RecipeFilter, )
+    raw_id_fields = ('user', 'recipe', )
 
 
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(BaseAdmin):
     list_display = ('id', 'user', 'recipe', )
-    search_fields = ('id', 'user', 'recipe', )
-    list_filter = ('user', 'recipe', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'recipe', )
+    search_fields = ('user__email__startswith', )
+    list_filter = (UserFilter, RecipeFilter, )
+    raw_id_fields = ('user', 'recipe', )
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(BaseAdmin):
     list_display = ('id', 'user', 'author', )
-    search_fields = ('id', 'user', 'author', )
-    list_filter = ('user', 'author', )
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author', )
+    search_fields = ('user__email__startswith', )
+    list_filter = (UserFilter, AuthorFilter, )
+    raw_id_fields = ('user', 'author', )
@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'rest_framework',
     'rest_framework.authtoken',
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,6 +74,26 @@ DATABASES = {
     }
 }
 
+# Кэш обязан быть общим для всех процессов: в нём хранятся версии данных
+# (recipes/versions.py), и сброс версии командой manage.py должен дойти до
+# веб-сервера. LocMemCache для этого не подходит. По умолчанию - файловый
+# кэш в каталоге, доступном всем процессам контейнера, в проде можно указать
+# Memcached через CACHE_BACKEND и CACHE_LOCATION
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        },
+    }
+}
+
 # Временно вернул SQLITE для запуска миграций локально, чтобы пройти Review
 # DATABASES = {
 #     'default': {
@@ -121,6 +143,39 @@ DEFAULT_RECIPES_LIMIT = 3
 
 RECIPES_ON_PAGE = 10
 
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+RECIPE_IMAGE_MAX_DIMENSION = 6000
+
+RECIPE_IMAGE_VARIANT_WIDTHS = (320, 640)
+
+RECIPE_IMAGE_WORKERS = 2
+
+# Изображение в base64 занимает на треть больше исходного размера
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 1024 * 1024
+
+INGREDIENT_CATALOGUE_TIMEOUT = 60 * 60 * 24
+
+INGREDIENT_SEARCH_LIMIT = 20
+
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+
+# Сколько хранится статус failed неудачного рендеринга списка покупок
+SHOPPING_LIST_STATUS_TIMEOUT = 60 * 10
+
+# Рецепты авторов с большим числом подписчиков не раскладываются по лентам,
+# а добавляются в ленту при чтении
+FEED_FANOUT_MAX_FOLLOWERS = 10000
+
+FEED_FANOUT_BATCH_SIZE = 1000
+
+FEED_FANOUT_WORKERS = 1
+
+# Сколько последних рецептов автора попадает в ленту при подписке
+FEED_BACKFILL_LIMIT = 50
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
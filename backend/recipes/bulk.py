@@ -0,0 +1,76 @@
+import csv
+import io
+from itertools import islice
+from typing import Iterable, Iterator, List, Sequence
+
+from django.db import connection
+from django.db.models import Max
+
+
+def batches(items: Iterable, size: int) -> Iterator[List]:
+    """Разбиение потока на списки длиной не больше size"""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def allocate_ids(model, count: int) -> List[int]:
+    """Резервирование первичных ключей для bulk_create.
+
+    На SQLite bulk_create не возвращает первичные ключи, а они нужны для
+    связанных записей. В PostgreSQL ключи берутся из последовательности
+    таблицы, поэтому не пересекаются с параллельными вставками. В остальных
+    базах ключи продолжают максимальный, вызывать функцию нужно внутри
+    транзакции."""
+    if count < 1:
+        return []
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                (table, model._meta.pk.column, count),
+            )
+            return [row[0] for row in cursor.fetchall()]
+    start = (model.objects.aggregate(max_id=Max('pk'))['max_id'] or 0) + 1
+    return list(range(start, start + count))
+
+
+def insert_rows(model, fields: Sequence[str], rows: Iterable[tuple]) -> int:
+    """Вставка строк значений без создания объектов моделей.
+
+    В PostgreSQL строки передаются командой COPY, в остальных базах -
+    через executemany. Значения должны быть уже готовы для базы: сигналы,
+    значения по умолчанию и преобразования полей не применяются, триггеры
+    базы срабатывают."""
+    quote_name = connection.ops.quote_name
+    table = quote_name(model._meta.db_table)
+    columns = ', '.join(
+        quote_name(model._meta.get_field(name).column) for name in fields
+    )
+    if connection.vendor == 'postgresql':
+        # Строки в кавычках, NULL - пустое значение без кавычек
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+        count = 0
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+        return count
+    rows = list(rows)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows
+        )
+    return len(rows)
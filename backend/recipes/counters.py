@@ -0,0 +1,84 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Cart, Favorite, Recipe, Subscription
+from users.models import User
+
+# Поле счётчика: модель и поле связи, строки которой он считает
+RECIPE_COUNTERS = {
+    'favorites_count': (Favorite, 'recipe'),
+    'carts_count': (Cart, 'recipe'),
+}
+USER_COUNTERS = {
+    'recipes_count': (Recipe, 'author'),
+    'followers_count': (Subscription, 'author'),
+}
+COUNTERS = ((Recipe, RECIPE_COUNTERS), (User, USER_COUNTERS))
+
+
+def change_counter(model, pk: int, field: str, delta: int):
+    """Атомарное изменение счётчика в базе, без чтения строки"""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def update_counters(sender, instance, delta: int):
+    """Изменение всех счётчиков, которые считают строки модели sender"""
+    for model, counters in COUNTERS:
+        for field, (related_model, related_field) in counters.items():
+            if related_model is sender:
+                change_counter(
+                    model,
+                    getattr(instance, f'{related_field}_id'),
+                    field,
+                    delta,
+                )
+
+
+def count_subquery(model, field: str):
+    """Число строк model, ссылающихся полем field на внешнюю строку"""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+def recount(model, counters: dict, ids=None) -> int:
+    """Пересчёт счётчиков по связанным таблицам одним UPDATE.
+
+    Если ids не переданы, пересчитываются все строки."""
+    queryset = model.objects.all()
+    if ids is not None:
+        queryset = queryset.filter(pk__in=list(ids))
+    return queryset.update(**{
+        field: count_subquery(related_model, related_field)
+        for field, (related_model, related_field) in counters.items()
+    })
+
+
+def recount_recipes(ids=None) -> int:
+    return recount(Recipe, RECIPE_COUNTERS, ids)
+
+
+def recount_users(ids=None) -> int:
+    return recount(User, USER_COUNTERS, ids)
+
+
+def find_mismatches(model, counters: dict):
+    """Строки, у которых сохранённые счётчики расходятся с пересчитанными"""
+    mismatches = []
+    for field, (related_model, related_field) in counters.items():
+        mismatches.extend(
+            (row['pk'], field, row[field], row['expected'])
+            for row in model.objects.annotate(
+                expected=count_subquery(related_model, related_field)
+            ).exclude(
+                **{field: F('expected')}
+            ).order_by('pk').values('pk', field, 'expected')
+        )
+    return mismatches
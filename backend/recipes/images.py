@@ -0,0 +1,105 @@
+import io
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from PIL import Image
+
+from recipes.models import Recipe
+from recipes.versions import RECIPES, bump_version
+
+VARIANTS_DIR = 'recipes/variants'
+WEBP = 'webp'
+FORMATS = {'jpg': 'JPEG', 'png': 'PNG', WEBP: 'WEBP'}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def variant_names(source_name: str, width: int) -> Tuple[str, str]:
+    """Имена уменьшенной копии в исходном формате и в WebP.
+
+    Имя исходного файла - хэш содержимого, уникальный для каждой загрузки,
+    поэтому имена копий однозначно определяются изображением и шириной."""
+    stem, extension = posixpath.splitext(posixpath.basename(source_name))
+    fallback = 'png' if extension.lower() in ('.png', '.gif') else 'jpg'
+    name = f'{VARIANTS_DIR}/{stem}_{width}'
+    return f'{name}.{fallback}', f'{name}.{WEBP}'
+
+
+def get_variants(source_name: str) -> List[Tuple[int, str, str]]:
+    return [
+        (width, *variant_names(source_name, width))
+        for width in settings.RECIPE_IMAGE_VARIANT_WIDTHS
+    ]
+
+
+def save_variant(image: Image.Image, name: str) -> None:
+    extension = posixpath.splitext(name)[1][1:]
+    if extension == 'jpg':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    content = io.BytesIO()
+    image.save(content, FORMATS[extension], quality=80, optimize=True)
+    default_storage.save(name, ContentFile(content.getvalue()))
+
+
+def build_variants(source_name: str) -> None:
+    """Создание недостающих уменьшенных копий изображения"""
+    missing = [
+        (width, name)
+        for width, *names in get_variants(source_name)
+        for name in names
+        if not default_storage.exists(name)
+    ]
+    if not missing:
+        return
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(source_name) as source:
+        image = Image.open(source)
+        image.load()
+    for width, name in missing:
+        variant = image.copy()
+        variant.thumbnail((width, image.height))
+        save_variant(variant, name)
+
+
+def generate_variants(recipe_id: int, source_name: str) -> None:
+    """Создание копий и отметка о готовности, если изображение рецепта не
+    сменилось за время обработки"""
+    try:
+        build_variants(source_name)
+        updated = Recipe.objects.filter(
+            pk=recipe_id, image=source_name
+        ).update(image_variants_ready=True)
+        if updated:
+            bump_version(RECIPES)
+    finally:
+        connection.close()
+        with _lock:
+            _pending.discard((recipe_id, source_name))
+
+
+def schedule_variants(recipe_id: int, source_name: str) -> None:
+    """Создание копий в фоновом пуле потоков, вне обработки запроса.
+
+    Повторная постановка того же изображения рецепта игнорируется, пока
+    предыдущая задача не завершилась."""
+    global _executor
+    key = (recipe_id, source_name)
+    with _lock:
+        if key in _pending:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS
+            )
+        _pending.add(key)
+    _executor.submit(generate_variants, recipe_id, source_name)
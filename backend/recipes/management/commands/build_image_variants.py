@@ -0,0 +1,41 @@
+from django.core.management import BaseCommand
+
+from recipes.images import build_variants
+from recipes.models import Recipe
+from recipes.versions import RECIPES, bump_version
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий изображений существующих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Проверить и все рецепты с готовыми копиями',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').exclude(image=None)
+        if not options['all']:
+            recipes = recipes.filter(image_variants_ready=False)
+        built = failed = 0
+        for recipe_id, source_name in recipes.values_list(
+            'id', 'image'
+        ).order_by('id').iterator():
+            try:
+                build_variants(source_name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                continue
+            Recipe.objects.filter(
+                pk=recipe_id, image=source_name
+            ).update(image_variants_ready=True)
+            built += 1
+        if built:
+            bump_version(RECIPES)
+        self.stdout.write(self.style.SUCCESS(
+            f'Копии изображений готовы для рецептов: {built}, '
+            f'ошибок: {failed}'
+        ))
@@ -0,0 +1,85 @@
+import json
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredients
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгрузка рецептов в NDJSON: по рецепту с тегами, ингредиентами и '
+        'именем файла изображения на строку'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для выгрузки, «-» - стандартный вывод'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Число рецептов, читаемых из базы за раз',
+        )
+
+    def recipes(self, batch_size: int):
+        """Рецепты пачками по первичному ключу, связи пачки - двумя
+        запросами"""
+        last_id = 0
+        while True:
+            recipes = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+                'pk'
+            ).values(
+                'id', 'author__email', 'name', 'text', 'cooking_time',
+                'pub_date', 'image',
+            )[:batch_size])
+            if not recipes:
+                return
+            ids = [recipe['id'] for recipe in recipes]
+            tags = defaultdict(list)
+            for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=ids
+            ).order_by('id').values_list('recipe_id', 'tag__slug'):
+                tags[recipe_id].append(slug)
+            ingredients = defaultdict(list)
+            for recipe_id, name, unit, amount in (
+                RecipeIngredients.objects.filter(
+                    recipe_id__in=ids
+                ).order_by('id').values_list(
+                    'recipe_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount',
+                )
+            ):
+                ingredients[recipe_id].append({
+                    'name': name, 'measurement_unit': unit, 'amount': amount
+                })
+            for recipe in recipes:
+                yield {
+                    'author': recipe['author__email'],
+                    'name': recipe['name'],
+                    'text': recipe['text'],
+                    'cooking_time': recipe['cooking_time'],
+                    'pub_date': recipe['pub_date'].isoformat(),
+                    'image': recipe['image'],
+                    'tags': tags[recipe['id']],
+                    'ingredients': ingredients[recipe['id']],
+                }
+            last_id = ids[-1]
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            output = self.stdout
+        else:
+            output = open(options['path'], 'w', encoding='utf-8')
+        count = 0
+        try:
+            for recipe in self.recipes(options['batch_size']):
+                output.write(json.dumps(recipe, ensure_ascii=False) + '\n')
+                count += 1
+        finally:
+            if output is not self.stdout:
+                output.close()
+        self.stderr.write(f'Выгружено рецептов: {count}')
@@ -0,0 +1,371 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.bulk import allocate_ids, batches, insert_rows
+from recipes.counters import recount_recipes, recount_users
+from recipes.feed import rebuild_feeds
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredients, ShoppingListItem, Subscription,
+                            Tag)
+from recipes.versions import (INGREDIENTS, RECIPES, TAGS, USERS,
+                              bump_version)
+from users.models import User
+
+BATCH_SIZE = 5000
+# Показатель хвоста распределения Парето для числа избранного, покупок и
+# подписок: большинство пользователей почти неактивны, немногие - очень
+PARETO_ALPHA = 1.5
+# Показатель закона Ципфа для популярности ингредиентов, тегов и рецептов
+ZIPF_EXPONENT = 1.0
+
+TAGS_DATA = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F2A93B', 'dessert'),
+    ('Выпечка', '#C0392B', 'baking'),
+    ('Салат', '#2ECC71', 'salad'),
+    ('Суп', '#3498DB', 'soup'),
+    ('Вегетарианское', '#16A085', 'vegetarian'),
+)
+DISHES = (
+    'суп', 'салат', 'пирог', 'омлет', 'рагу', 'каша', 'запеканка',
+    'паста', 'плов', 'котлеты', 'блины', 'сырники', 'борщ', 'жаркое',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'праздничный', 'летний', 'острый', 'сытный',
+    'лёгкий', 'бабушкин', 'пряный', 'нежный',
+)
+WORDS = (
+    'нарезать', 'смешать', 'обжарить', 'довести', 'до', 'кипения',
+    'добавить', 'посолить', 'поперчить', 'запекать', 'минут', 'подавать',
+    'горячим', 'остудить', 'взбить', 'тушить', 'под', 'крышкой', 'и',
+)
+
+
+def zipf_weights(count: int) -> list:
+    """Накопленные веса для random.choices: элемент с номером n
+    выбирается в n раз реже первого"""
+    return list(accumulate(
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, count + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = (
+        'Создание воспроизводимого синтетического набора данных для '
+        'нагрузочного тестирования: пользователи, рецепты, избранное, '
+        'корзины и подписки'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Число пользователей',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Число рецептов',
+        )
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help=(
+                'Число ингредиентов в справочнике. Недостающие до этого '
+                'числа создаются'
+            ),
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=10,
+            help='Среднее число избранных рецептов на пользователя',
+        )
+        parser.add_argument(
+            '--carts', type=float, default=2,
+            help='Среднее число рецептов в корзине пользователя',
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=5,
+            help='Среднее число подписок пользователя',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределены даты публикации',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел',
+        )
+        parser.add_argument(
+            '--prefix', default='bench',
+            help='Префикс имён и адресов эл.почты пользователей',
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Число строк в одной пачке вставки',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть больше нуля')
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        if User.objects.filter(
+            username__startswith=options['prefix']
+        ).exists():
+            raise CommandError(
+                f'Пользователи с префиксом «{options["prefix"]}» уже есть, '
+                f'укажите другой --prefix'
+            )
+        self.options = options
+        self.batch_size = options['batch_size']
+        self.random = random.Random(options['seed'])
+        self.started = time.monotonic()
+
+        tag_ids = self.create_tags()
+        ingredient_ids = self.create_ingredients(options['ingredients'])
+        user_ids = self.create_users(options['users'])
+        # Популярность авторов и рецептов - случайная перестановка,
+        # одинаковая при одном и том же --seed
+        authors = user_ids[:]
+        self.random.shuffle(authors)
+        recipe_ids = self.create_recipes(
+            options['recipes'], authors, tag_ids, ingredient_ids
+        )
+        self.random.shuffle(recipe_ids)
+        self.create_relations(
+            Favorite, user_ids, recipe_ids, options['favorites']
+        )
+        self.create_relations(Cart, user_ids, recipe_ids, options['carts'])
+        self.create_subscriptions(user_ids, authors, options['subscriptions'])
+        self.refresh_shopping_lists()
+        self.recount(recipe_ids, user_ids)
+        self.rebuild_feeds(user_ids)
+        for name in (INGREDIENTS, RECIPES, TAGS, USERS):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Набор данных создан за {time.monotonic() - self.started:.0f} с'
+        ))
+
+    def progress(self, what: str, count: int):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        self.stdout.write(f'{what}: {count} ({elapsed:.0f} с)')
+
+    def power_law_count(self, mean: float, limit: int) -> int:
+        """Число связей пользователя по распределению Парето со средним
+        около mean"""
+        if mean <= 0 or limit <= 0:
+            return 0
+        scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+        return min(limit, int(scale * self.random.paretovariate(
+            PARETO_ALPHA
+        )))
+
+    def create_tags(self) -> list:
+        for name, color, slug in TAGS_DATA:
+            if not Tag.objects.filter(
+                Q(name=name) | Q(color=color) | Q(slug=slug)
+            ).exists():
+                Tag.objects.create(name=name, color=color, slug=slug)
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_ingredients(self, count: int) -> list:
+        existing = Ingredient.objects.count()
+        if count > existing:
+            for batch in batches(range(existing, count), self.batch_size):
+                Ingredient.objects.bulk_create(
+                    (
+                        Ingredient(
+                            name=f'ингредиент {number}',
+                            measurement_unit=self.random.choice(
+                                ('г', 'мл', 'шт.', 'ст. л.', 'по вкусу')
+                            ),
+                        )
+                        for number in batch
+                    ),
+                    ignore_conflicts=True,
+                )
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        self.progress('Ингредиентов', len(ingredient_ids))
+        return ingredient_ids
+
+    def create_users(self, count: int) -> list:
+        # Хэш пароля считается один раз: на каждого пользователя это
+        # заняло бы больше времени, чем вся остальная вставка
+        password = make_password(self.options['password'])
+        prefix = self.options['prefix']
+        user_ids = []
+        for batch in batches(range(count), self.batch_size):
+            with transaction.atomic():
+                ids = allocate_ids(User, len(batch))
+                User.objects.bulk_create(
+                    User(
+                        pk=user_id,
+                        username=f'{prefix}{number}',
+                        email=f'{prefix}{number}@example.com',
+                        first_name='Имя',
+                        last_name=f'Фамилия {number}',
+                        password=password,
+                    )
+                    for user_id, number in zip(ids, batch)
+                )
+            user_ids.extend(ids)
+            self.progress('Пользователей', len(user_ids))
+        return user_ids
+
+    def recipe(self, recipe_id: int, author_id: int, now) -> tuple:
+        words = self.random.choices(WORDS, k=self.random.randint(10, 60))
+        pub_date = now - timedelta(
+            seconds=self.random.randint(0, self.options['days'] * 86400)
+        )
+        return (
+            recipe_id,
+            author_id,
+            f'{self.random.choice(ADJECTIVES).capitalize()} '
+            f'{self.random.choice(DISHES)} №{recipe_id}',
+            ' '.join(words).capitalize() + '.',
+            self.random.randint(5, 180),
+            connection.ops.adapt_datetimefield_value(pub_date),
+            False,
+            0,
+            0,
+        )
+
+    def create_recipes(self, count, authors, tag_ids, ingredient_ids):
+        author_weights = zipf_weights(len(authors))
+        tag_weights = zipf_weights(len(tag_ids))
+        ingredient_weights = zipf_weights(len(ingredient_ids))
+        now = timezone.now()
+        recipe_ids = []
+        for batch in batches(range(count), self.batch_size):
+            with transaction.atomic():
+                ids = allocate_ids(Recipe, len(batch))
+                insert_rows(
+                    Recipe,
+                    (
+                        'id', 'author', 'name', 'text', 'cooking_time',
+                        'pub_date', 'image_variants_ready',
+                        'favorites_count', 'carts_count',
+                    ),
+                    (
+                        self.recipe(recipe_id, author_id, now)
+                        for recipe_id, author_id in zip(
+                            ids, self.random.choices(
+                                authors, cum_weights=author_weights,
+                                k=len(ids),
+                            )
+                        )
+                    ),
+                )
+                insert_rows(
+                    Recipe.tags.through,
+                    ('recipe', 'tag'),
+                    (
+                        (recipe_id, tag_id)
+                        for recipe_id in ids
+                        for tag_id in set(self.random.choices(
+                            tag_ids, cum_weights=tag_weights,
+                            k=self.random.randint(1, 3),
+                        ))
+                    ),
+                )
+                insert_rows(
+                    RecipeIngredients,
+                    ('recipe', 'ingredient', 'amount'),
+                    (
+                        (recipe_id, ingredient_id, self.random.randint(1, 500))
+                        for recipe_id in ids
+                        for ingredient_id in set(self.random.choices(
+                            ingredient_ids, cum_weights=ingredient_weights,
+                            k=max(1, int(self.random.gauss(7, 3))),
+                        ))
+                    ),
+                )
+            recipe_ids.extend(ids)
+            self.progress('Рецептов', len(recipe_ids))
+        return recipe_ids
+
+    def create_relations(self, model, user_ids, recipe_ids, mean):
+        """Избранное или корзины: число рецептов у пользователя по закону
+        Парето, сами рецепты - по популярности"""
+        if not recipe_ids:
+            return
+        weights = zipf_weights(len(recipe_ids))
+        created = 0
+        for batch in batches(user_ids, self.batch_size):
+            with transaction.atomic():
+                created += insert_rows(model, ('user', 'recipe'), (
+                    (user_id, recipe_id)
+                    for user_id in batch
+                    for recipe_id in set(self.random.choices(
+                        recipe_ids, cum_weights=weights,
+                        k=self.power_law_count(mean, len(recipe_ids)),
+                    ))
+                ))
+        self.progress(model._meta.verbose_name_plural, created)
+
+    def create_subscriptions(self, user_ids, authors, mean):
+        """Подписки на авторов: чем больше у автора рецептов, тем больше
+        у него подписчиков"""
+        weights = zipf_weights(len(authors))
+        created = 0
+        for batch in batches(user_ids, self.batch_size):
+            with transaction.atomic():
+                created += insert_rows(Subscription, ('user', 'author'), (
+                    (user_id, author_id)
+                    for user_id in batch
+                    for author_id in set(self.random.choices(
+                        authors, cum_weights=weights,
+                        k=self.power_law_count(mean, len(authors) - 1),
+                    ))
+                    if author_id != user_id
+                ))
+        self.progress('Подписок', created)
+
+    def recount(self, recipe_ids, user_ids):
+        """Строки вставлены без сигналов, счётчики рецептов и
+        пользователей пересчитываются пачками"""
+        for ids in batches(sorted(recipe_ids), self.batch_size):
+            with transaction.atomic():
+                recount_recipes(ids)
+        for ids in batches(user_ids, self.batch_size):
+            with transaction.atomic():
+                recount_users(ids)
+        self.progress('Пересчитаны счётчики рецептов', len(recipe_ids))
+
+    def rebuild_feeds(self, user_ids):
+        """Подписки вставлены без сигналов, ленты собираются по ним
+        пачками пользователей"""
+        created = 0
+        for ids in batches(user_ids, self.batch_size):
+            with transaction.atomic():
+                created += rebuild_feeds(ids)
+        self.progress('Записей лент', created)
+
+    def refresh_shopping_lists(self):
+        """Корзины вставлены без сигналов, итоги списков покупок
+        пересчитываются пачками пользователей"""
+        user_ids = list(Cart.objects.filter(
+            user__username__startswith=self.options['prefix']
+        ).values_list('user_id', flat=True).distinct().order_by('user_id'))
+        for batch in batches(user_ids, self.batch_size // 10 or 1):
+            with transaction.atomic():
+                ShoppingListItem.objects.refresh(batch)
+        self.progress(
+            'Строк списков покупок',
+            ShoppingListItem.objects.filter(
+                user__username__startswith=self.options['prefix']
+            ).count(),
+        )
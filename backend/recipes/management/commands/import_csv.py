@@ -1,19 +1,145 @@
 import csv
+import json
+import os
+import re
+import time
+from contextlib import nullcontext
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
+from recipes.bulk import batches
 from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS, bump_version
+
+DEFAULT_PATH = 'data/ingredients.csv'
+BATCH_SIZE = 1000
+READ_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'\s*')
+
+
+def normalize(value: str) -> str:
+    """Схлопывание пробелов. Регистр сохраняется: дубли, отличающиеся
+    только регистром, отсекает уникальный индекс по LOWER()"""
+    return ' '.join(value.split())
+
+
+def csv_rows(file):
+    yield from csv.DictReader(file, delimiter=',')
+
+
+def json_rows(file):
+    """Разбор JSON-массива объектов по одному, без чтения файла целиком"""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE)
+    position = WHITESPACE.match(buffer).end()
+    if buffer[position:position + 1] != '[':
+        raise CommandError('Ожидается JSON-массив ингредиентов')
+    position += 1
+    eof = False
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if position < len(buffer):
+            if buffer[position] == ']':
+                return
+            if buffer[position] == ',':
+                position += 1
+                continue
+            try:
+                row, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise CommandError('Некорректный JSON')
+            else:
+                yield row
+                continue
+        elif eof:
+            raise CommandError('Неожиданный конец JSON')
+        chunk = file.read(READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+READERS = {'.csv': csv_rows, '.json': json_rows}
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        with open(
-            'data/ingredients.csv',
-            'r',
-            encoding='utf-8',
-            newline=''
-        ) as csvfile:
-            reader = csv.DictReader(csvfile, delimiter=',')
-            Ingredient.objects.bulk_create(
-                Ingredient(**data) for data in reader)
-        self.stdout.write(self.style.SUCCESS('Данные успешно загружены'))
+    help = (
+        'Загрузка ингредиентов из CSV или JSON. Повторная загрузка не '
+        'создаёт дублей: уже существующие ингредиенты пропускаются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=DEFAULT_PATH,
+            help='Файл ingredients.csv или ingredients.json',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Число строк в одной пачке вставки',
+        )
+        parser.add_argument(
+            '--chunked',
+            action='store_true',
+            help=(
+                'Фиксировать каждую пачку отдельно. Прерванную загрузку '
+                'можно повторить, загруженные пачки будут пропущены'
+            ),
+        )
+
+    def ingredients(self, rows):
+        for line, row in enumerate(rows, start=1):
+            try:
+                name = normalize(row['name'])
+                measurement_unit = normalize(row['measurement_unit'])
+            except (KeyError, AttributeError, TypeError):
+                raise CommandError(f'Строка {line}: некорректные данные')
+            if name and measurement_unit:
+                yield Ingredient(
+                    name=name, measurement_unit=measurement_unit
+                )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пачки должен быть больше нуля')
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются файлы .csv и .json')
+        count_before = Ingredient.objects.count()
+        with open(path, 'r', encoding='utf-8', newline='') as file:
+            ingredients = self.ingredients(reader(file))
+            if options['chunked']:
+                processed = self.load(ingredients, batch_size, atomic=True)
+            else:
+                with transaction.atomic():
+                    processed = self.load(
+                        ingredients, batch_size, atomic=False
+                    )
+        created = Ingredient.objects.count() - count_before
+        bump_version(INGREDIENTS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные успешно загружены: новых ингредиентов {created}, '
+            f'пропущено {processed - created}'
+        ))
+
+    def load(self, ingredients, batch_size: int, atomic: bool) -> int:
+        """Вставка пачками с выводом хода загрузки и скорости"""
+        started = time.monotonic()
+        processed = 0
+        for batch in batches(ingredients, batch_size):
+            with transaction.atomic() if atomic else nullcontext():
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+            processed += len(batch)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'Обработано строк: {processed} '
+                f'({processed / elapsed:.0f} строк/с)'
+            )
+        return processed
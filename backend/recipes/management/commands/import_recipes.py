@@ -0,0 +1,149 @@
+import json
+import sys
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.bulk import allocate_ids, batches
+from recipes.counters import recount_users
+from recipes.feed import rebuild_feeds
+from recipes.models import (Ingredient, Recipe, RecipeIngredients,
+                            Subscription, Tag)
+from recipes.versions import RECIPES, bump_version
+from users.models import User
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Загрузка рецептов из NDJSON, выгруженного командой export_recipes. '
+        'Авторы, теги и ингредиенты должны уже существовать'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл NDJSON, «-» - стандартный ввод'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Число рецептов в одной пачке вставки',
+        )
+
+    def load_lookups(self):
+        """Справочники для связей загружаются один раз, а не на каждую
+        строку"""
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, measurement_unit): ingredient_id
+            for ingredient_id, name, measurement_unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+
+    def parse_recipe(self, data: dict):
+        pub_date = timezone.now()
+        if data.get('pub_date'):
+            pub_date = parse_datetime(data['pub_date'])
+            if pub_date is None:
+                raise ValueError('некорректная дата публикации')
+        recipe = Recipe(
+            author_id=self.authors[data['author']],
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time'],
+            pub_date=pub_date,
+            image=data.get('image') or None,
+        )
+        tag_ids = list(dict.fromkeys(self.tags[slug] for slug in data['tags']))
+        amounts = {}
+        for ingredient in data['ingredients']:
+            ingredient_id = self.ingredients[
+                (ingredient['name'], ingredient['measurement_unit'])
+            ]
+            amounts[ingredient_id] = (
+                amounts.get(ingredient_id, 0) + int(ingredient['amount'])
+            )
+        return recipe, tag_ids, amounts
+
+    def parse(self, file):
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield self.parse_recipe(json.loads(line))
+            except KeyError as error:
+                raise CommandError(f'Строка {line_number}: не найдено {error}')
+            except (TypeError, ValueError) as error:
+                raise CommandError(f'Строка {line_number}: {error}')
+
+    def create(self, batch):
+        """Вставка пачки рецептов и их связей тремя запросами"""
+        ids = allocate_ids(Recipe, len(batch))
+        for recipe_id, (recipe, _, _) in zip(ids, batch):
+            recipe.pk = recipe_id
+        Recipe.objects.bulk_create(recipe for recipe, _, _ in batch)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+            for recipe, tag_ids, _ in batch
+            for tag_id in tag_ids
+        )
+        RecipeIngredients.objects.bulk_create(
+            RecipeIngredients(
+                recipe_id=recipe.pk, ingredient_id=ingredient_id, amount=amount
+            )
+            for recipe, _, amounts in batch
+            for ingredient_id, amount in amounts.items()
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('Размер пачки должен быть больше нуля')
+        self.load_lookups()
+        if options['path'] == '-':
+            file = sys.stdin
+        else:
+            file = open(options['path'], 'r', encoding='utf-8')
+        started = time.monotonic()
+        count = 0
+        author_ids = set()
+        try:
+            with transaction.atomic():
+                for batch in batches(self.parse(file), options['batch_size']):
+                    self.create(batch)
+                    author_ids.update(
+                        recipe.author_id for recipe, _, _ in batch
+                    )
+                    count += len(batch)
+                    elapsed = max(time.monotonic() - started, 1e-6)
+                    self.stdout.write(
+                        f'Загружено рецептов: {count} '
+                        f'({count / elapsed:.0f} рецептов/с)'
+                    )
+                # bulk_create не вызывает сигналы, счётчики рецептов
+                # авторов пересчитываются отдельно
+                follower_ids = set()
+                for ids in batches(author_ids, options['batch_size']):
+                    recount_users(ids)
+                    follower_ids.update(Subscription.objects.filter(
+                        author_id__in=ids
+                    ).values_list('user_id', flat=True))
+                # и не раскладывает рецепты по лентам: ленты подписчиков
+                # авторов пересобираются
+                for ids in batches(follower_ids, options['batch_size']):
+                    rebuild_feeds(ids)
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        bump_version(RECIPES)
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецепты загружены: {count}. Уменьшенные копии изображений '
+            f'создаёт команда build_image_variants'
+        ))
@@ -0,0 +1,45 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import COUNTERS, find_mismatches, recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчёт и проверка счётчиков избранного, корзин, рецептов '
+        'авторов и подписчиков'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить счётчики со связанными таблицами',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self.verify()
+        with transaction.atomic():
+            for model, counters in COUNTERS:
+                updated = recount(model, counters)
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}: '
+                    f'пересчитано строк {updated}'
+                )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
+
+    def verify(self):
+        mismatched = 0
+        for model, counters in COUNTERS:
+            for pk, field, actual, expected in find_mismatches(
+                model, counters
+            ):
+                mismatched += 1
+                self.stdout.write(
+                    f'{model._meta.verbose_name} {pk}, {field}: '
+                    f'ожидается {expected}, сохранено {actual}'
+                )
+        if mismatched:
+            raise CommandError(f'Расхождений в счётчиках: {mismatched}')
+        self.stdout.write(self.style.SUCCESS('Счётчики согласованы'))
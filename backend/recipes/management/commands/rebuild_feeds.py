@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.feed import rebuild_feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересборка лент подписок: нужна после загрузки подписок или '
+        'рецептов в обход сигналов'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            created = rebuild_feeds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны, записей: {created}'
+        ))
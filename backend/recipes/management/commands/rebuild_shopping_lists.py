@@ -0,0 +1,64 @@
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import Cart, RecipeIngredients, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт и проверка итогов списков покупок пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить итоги с корзинами, ничего не изменяя',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            return self.verify()
+        with transaction.atomic():
+            ShoppingListItem.objects.all().delete()
+            user_ids = Cart.objects.values_list(
+                'user_id', flat=True
+            ).distinct().order_by()
+            items = ShoppingListItem.objects.refresh(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок пересчитаны, строк: {len(items)}'
+        ))
+
+    def verify(self):
+        expected = {
+            (row['recipe__shopping_cart__user_id'], row['ingredient_id']):
+                row['total']
+            for row in RecipeIngredients.objects.filter(
+                recipe__shopping_cart__isnull=False
+            ).values(
+                'recipe__shopping_cart__user_id', 'ingredient_id'
+            ).annotate(total=Sum('amount')).order_by()
+        }
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount
+            in ShoppingListItem.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            ).order_by()
+        }
+        mismatched = {
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        }
+        for user_id, ingredient_id in sorted(mismatched):
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'ожидается {expected.get((user_id, ingredient_id))}, '
+                f'сохранено {actual.get((user_id, ingredient_id))}'
+            )
+        if mismatched:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatched)}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Списки покупок согласованы, строк: {len(actual)}'
+        ))
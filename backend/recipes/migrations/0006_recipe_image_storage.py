@@ -0,0 +1,19 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:45
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, help_text='Загрузите изображение', null=True, storage=recipes.storage.ContentHashStorage(), upload_to='recipes/images/', verbose_name='Изображение'),
+        ),
+    ]
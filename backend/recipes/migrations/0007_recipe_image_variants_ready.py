@@ -0,0 +1,18 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants_ready',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Уменьшенные копии изображения готовы'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 2.2.28 on 2026-10-18 03:48
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Объединение ингредиентов, различающихся только регистром.
+
+    Сохранённые названия не меняются: ключ сравнения вычисляет база тем же
+    LOWER(), что и уникальный индекс из 0014. Ингредиенты рецептов с дублем
+    переносятся на оставшийся ингредиент, списки покупок затронутых
+    пользователей пересчитываются."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredients = apps.get_model('recipes', 'RecipeIngredients')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    kept = {}
+    duplicates = {}
+    rows = Ingredient.objects.annotate(
+        name_key=Lower('name'), unit_key=Lower('measurement_unit')
+    ).order_by('id').values_list('id', 'name_key', 'unit_key')
+    for pk, name_key, unit_key in rows.iterator():
+        key = (name_key, unit_key)
+        if key in kept:
+            duplicates[pk] = kept[key]
+        else:
+            kept[key] = pk
+    if not duplicates:
+        return
+    for row in RecipeIngredients.objects.filter(
+        ingredient_id__in=duplicates
+    ):
+        target = RecipeIngredients.objects.filter(
+            recipe_id=row.recipe_id, ingredient_id=duplicates[row.ingredient_id]
+        ).first()
+        if target is None:
+            row.ingredient_id = duplicates[row.ingredient_id]
+            row.save(update_fields=('ingredient',))
+        else:
+            target.amount += row.amount
+            target.save(update_fields=('amount',))
+            row.delete()
+    user_ids = set(ShoppingListItem.objects.filter(
+        ingredient_id__in=duplicates
+    ).values_list('user_id', flat=True))
+    ShoppingListItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingListItem.objects.bulk_create(
+        ShoppingListItem(
+            user_id=row['recipe__shopping_cart__user_id'],
+            ingredient_id=row['ingredient_id'],
+            amount=row['total'],
+        )
+        for row in RecipeIngredients.objects.filter(
+            recipe__shopping_cart__user_id__in=user_ids
+        ).values(
+            'recipe__shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=models.Sum('amount')).order_by()
+    )
+    Ingredient.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_image_variants_ready'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
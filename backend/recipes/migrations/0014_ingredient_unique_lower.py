@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_feedentry'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='ingredient',
+            name='unique_ingredient',
+        ),
+        migrations.RunSQL(
+            'CREATE UNIQUE INDEX unique_ingredient_lower '
+            'ON recipes_ingredient (LOWER(name), LOWER(measurement_unit))',
+            'DROP INDEX unique_ingredient_lower',
+        ),
+    ]
@@ -1,10 +1,18 @@
 from typing import List, Optional
 
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db import connections, models
+from django.db.models import Exists, F, OuterRef, Q, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
-from users.models import User
+from recipes.storage import ContentHashStorage
+from recipes.versions import SHOPPING_LIST, bump_versions_on_commit
+from users.models import CountersMixin, User
+
+SEARCH_CONFIG = 'russian'
 
 
 class Ingredient(models.Model):
@@ -22,6 +30,17 @@ class Ingredient(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
         ordering = ('name',)
+        # Уникальность без учёта регистра обеспечивает индекс
+        # unique_ingredient_lower по LOWER(name), LOWER(measurement_unit),
+        # созданный миграцией 0014: UniqueConstraint в Django 2.2 не
+        # поддерживает выражения
+        indexes = (
+            models.Index(
+                fields=('name',),
+                name='ingredient_name_prefix_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        )
 
     def __str__(self):
         return f'{self.name} {self.measurement_unit}'
@@ -55,10 +74,63 @@ class Tag(models.Model):
 
 
 class RecipeQuerySet(models.QuerySet):
-    def filter_by_tags(self, tags: List[str]):
-        if tags:
-            return self.filter(tags__slug__in=tags).distinct()
-        return self
+    def filter_by_tags(self, tag_ids: List[int], match_all: bool = False):
+        """Отбор рецептов по id тегов подзапросами EXISTS.
+
+        Без соединения с тегами строки рецептов не размножаются и DISTINCT
+        не нужен. match_all - рецепт должен иметь все теги, иначе хотя бы
+        один из них."""
+        tag_ids = list(dict.fromkeys(tag_ids))
+        if not tag_ids:
+            return self
+        recipe_tags = self.model.tags.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        )
+        if not match_all:
+            return self.annotate(has_tags=Exists(
+                recipe_tags.filter(tag_id__in=tag_ids)
+            )).filter(has_tags=True)
+        queryset = self
+        for tag_id in tag_ids:
+            alias = f'has_tag_{tag_id}'
+            queryset = queryset.annotate(**{
+                alias: Exists(recipe_tags.filter(tag_id=tag_id))
+            }).filter(**{alias: True})
+        return queryset
+
+    def search(self, text: str):
+        """Полнотекстовый поиск по названию и описанию с ранжированием.
+
+        Вектор поиска поддерживается триггером PostgreSQL, на других СУБД
+        выполняется простой поиск по подстроке без ранжирования. В SQLite
+        такой поиск не зависит от регистра только для латиницы: LIKE и
+        lower() не приводят регистр кириллицы."""
+        if connections[self.db].vendor != 'postgresql':
+            return self.filter(
+                Q(name__icontains=text) | Q(text__icontains=text)
+            )
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        return self.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-pub_date')
+
+    def latest_for_authors(self, author_ids: List[int], limit: int):
+        """Последние limit рецептов каждого из авторов одним запросом"""
+        if not author_ids or limit < 1:
+            return self.none()
+        ranked = self.filter(author_id__in=author_ids).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).order_by()
+        sql, params = ranked.query.sql_with_params()
+        return self.raw(
+            f'SELECT * FROM ({sql}) AS ranked WHERE row_number <= %s '
+            f'ORDER BY pub_date DESC, id DESC',
+            (*params, limit),
+        )
 
     def add_user_annotations(self, user_id: Optional[int]):
         return self.annotate(
@@ -75,8 +147,10 @@ class RecipeQuerySet(models.QuerySet):
         )
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель для рецептов"""
+    COUNTER_FIELDS = ('favorites_count', 'carts_count')
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -98,10 +172,16 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Изображение',
         upload_to='recipes/images/',
+        storage=ContentHashStorage(),
         blank=True,
         null=True,
         help_text='Загрузите изображение',
     )
+    image_variants_ready = models.BooleanField(
+        verbose_name='Уменьшенные копии изображения готовы',
+        default=False,
+        editable=False,
+    )
     name = models.CharField(
         verbose_name='Название рецепта',
         max_length=200,
@@ -121,9 +201,26 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField(
         verbose_name='Дата публикации',
-        auto_now_add=True,
+        default=timezone.now,
+        editable=False,
         db_index=True
     )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Количество добавлений в избранное',
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    carts_count = models.PositiveIntegerField(
+        verbose_name='Количество добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
 
     objects = RecipeQuerySet.as_manager()
 
@@ -131,6 +228,21 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('pub_date',)
+        indexes = (
+            models.Index(
+                fields=('pub_date', 'id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('name',),
+                name='recipe_name_prefix_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -234,6 +346,80 @@ class Cart(models.Model):
         )
 
 
+class ShoppingListQuerySet(models.QuerySet):
+    def refresh(self, user_ids, ingredient_ids=None):
+        """Пересчёт итогов списка покупок по содержимому корзины.
+
+        Если переданы ingredient_ids, пересчитываются только строки этих
+        ингредиентов, иначе - весь список покупок пользователей."""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return []
+        stale = self.filter(user_id__in=user_ids)
+        totals = RecipeIngredients.objects.filter(
+            recipe__shopping_cart__user_id__in=user_ids
+        )
+        if ingredient_ids is not None:
+            stale = stale.filter(ingredient_id__in=ingredient_ids)
+            totals = totals.filter(ingredient_id__in=ingredient_ids)
+        totals = totals.values(
+            'recipe__shopping_cart__user_id', 'ingredient_id'
+        ).annotate(total=Sum('amount')).order_by()
+        stale.delete()
+        items = self.bulk_create(
+            self.model(
+                user_id=row['recipe__shopping_cart__user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total'],
+            )
+            for row in totals
+        )
+        bump_versions_on_commit(SHOPPING_LIST, user_ids)
+        return items
+
+    def refresh_for_recipe(self, recipe_id: int, ingredient_ids=None):
+        """Пересчёт списков покупок всех, у кого рецепт в корзине"""
+        user_ids = Cart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+        return self.refresh(user_ids, ingredient_ids)
+
+
+class ShoppingListItem(models.Model):
+    """Модель для итогов списка покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингридиент',
+        related_name='shopping_list',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Строки списков покупок'
+        ordering = ('user', 'ingredient',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient',),
+                name='unique_shopping_list_item',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} - {self.amount}'
+
+
 class Subscription(models.Model):
     """Модель для подписки"""
     user = models.ForeignKey(
@@ -266,3 +452,49 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.user} follows {self.author}'
+
+
+class FeedEntry(models.Model):
+    """Модель для записи ленты: рецепт автора, на которого подписан
+    пользователь"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='feed',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Автор',
+        related_name='+',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        ordering = ('user', '-pub_date', '-recipe')
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user_id} - {self.recipe_id}'
@@ -1,6 +1,126 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.feed import get_feed
 
 
 class RecipePagination(PageNumberPagination):
     """Класс для пагинации рецептов"""
     page_size = 6
+
+
+class RecipeCursorPagination(BasePagination):
+    """Пагинация рецептов по ключу (pub_date, id) для бесконечной ленты.
+
+    Страница выбирается условием по индексу вместо OFFSET, общее число
+    рецептов не считается, а новые рецепты не сдвигают следующие страницы.
+    Включается параметром ?cursor= (пустым для первой страницы)."""
+    page_size = RecipePagination.page_size
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_position(self, pub_date, pk) -> str:
+        position = f'{pub_date.isoformat()}|{pk}'
+        return b64encode(position.encode()).decode()
+
+    def encode_cursor(self, recipe) -> str:
+        return self.encode_position(recipe.pub_date, recipe.pk)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = b64decode(cursor.encode()).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = remove_query_param(
+            request.build_absolute_uri(), 'page'
+        )
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            )
+        page_size = self.get_page_size(request)
+        results = list(queryset[:page_size + 1])
+        self.page = results[:page_size]
+        self.has_next = len(results) > page_size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(RecipeCursorPagination):
+    """Курсорная пагинация ленты подписок: страница выбирается по записям
+    ленты, из queryset берутся только рецепты страницы.
+
+    Курсор строится по позициям из ленты, а не по рецептам страницы:
+    удалённые тем временем рецепты пропадают со страницы, но не сбивают
+    переход к следующей."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        positions = get_feed(
+            request.user.pk, self.decode_cursor(request), page_size + 1
+        )
+        self.has_next = len(positions) > page_size
+        positions = positions[:page_size]
+        self.last_position = positions[-1] if positions else None
+        recipe_ids = [recipe_id for _, recipe_id in positions]
+        recipes = queryset.in_bulk(recipe_ids)
+        self.page = [
+            recipes[recipe_id] for recipe_id in recipe_ids
+            if recipe_id in recipes
+        ]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            self.encode_position(*self.last_position),
+        )
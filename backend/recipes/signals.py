@@ -0,0 +1,163 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.counters import update_counters
+from recipes.feed import (backfill, remove_author, schedule_fan_out,
+                          sync_fanout_mode)
+from recipes.images import schedule_variants
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredients, ShoppingListItem, Subscription,
+                            Tag)
+from recipes.versions import (INGREDIENTS, RECIPES, TAGS, USER_RELATIONS,
+                              USERS, bump_version_on_commit)
+from users.models import User
+
+
+@receiver(post_save, sender=Cart)
+def add_recipe_to_shopping_list(sender, instance, created, **kwargs):
+    """Добавление ингредиентов рецепта в итоги списка покупок"""
+    ingredient_ids = RecipeIngredients.objects.filter(
+        recipe_id=instance.recipe_id
+    ).values_list('ingredient_id', flat=True)
+    ShoppingListItem.objects.refresh([instance.user_id], ingredient_ids)
+
+
+@receiver(post_delete, sender=Cart)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    """Удаление ингредиентов рецепта из итогов списка покупок.
+
+    При каскадном удалении рецепта его ингредиенты могут быть уже удалены,
+    тогда список покупок пользователя пересчитывается целиком."""
+    ingredient_ids = list(
+        RecipeIngredients.objects.filter(
+            recipe_id=instance.recipe_id
+        ).values_list('ingredient_id', flat=True)
+    )
+    ShoppingListItem.objects.refresh(
+        [instance.user_id], ingredient_ids or None
+    )
+
+
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def refresh_shopping_lists(sender, instance, **kwargs):
+    """Пересчёт списков покупок при изменении ингредиента рецепта"""
+    ShoppingListItem.objects.refresh_for_recipe(
+        instance.recipe_id, [instance.ingredient_id]
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    """Сброс кэшей, построенных по таблице ингредиентов"""
+    bump_version_on_commit(INGREDIENTS)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredients)
+@receiver(post_delete, sender=RecipeIngredients)
+def invalidate_recipes(sender, **kwargs):
+    """Сброс кэшей, построенных по рецептам"""
+    bump_version_on_commit(RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_version_on_commit(RECIPES)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    """Сброс кэшей, построенных по тегам"""
+    bump_version_on_commit(TAGS)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_users(sender, update_fields=None, **kwargs):
+    """Сброс кэшей с данными пользователей, кроме обновления last_login"""
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        bump_version_on_commit(USERS)
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_delete, sender=Cart)
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_user_relations(sender, instance, **kwargs):
+    """Смена личной версии пользователя: избранное, корзина и подписки"""
+    bump_version_on_commit(USER_RELATIONS, instance.user_id)
+
+
+@receiver(post_save, sender=Cart)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def increment_counters(sender, instance, created, raw=False, **kwargs):
+    """Рост счётчиков избранного, корзин, рецептов и подписчиков"""
+    if created and not raw:
+        update_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Cart)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def decrement_counters(sender, instance, **kwargs):
+    update_counters(sender, instance, -1)
+
+
+@receiver(pre_save, sender=Recipe)
+def reset_image_variants(sender, instance, **kwargs):
+    """Новое изображение рецепта требует новых уменьшенных копий"""
+    if instance.image and not instance.image._committed:
+        instance.image_variants_ready = False
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(sender, instance, **kwargs):
+    """Создание уменьшенных копий после фиксации транзакции"""
+    if instance.image and not instance.image_variants_ready:
+        recipe_id, source_name = instance.pk, instance.image.name
+        transaction.on_commit(
+            lambda: schedule_variants(recipe_id, source_name)
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, raw=False, **kwargs):
+    """Раскладка нового рецепта по лентам подписчиков после фиксации"""
+    if created and not raw:
+        recipe_id = instance.pk
+        transaction.on_commit(lambda: schedule_fan_out(recipe_id))
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        user_id, author_id = instance.user_id, instance.author_id
+
+        def update_feeds():
+            sync_fanout_mode(author_id)
+            backfill(user_id, author_id)
+
+        transaction.on_commit(update_feeds)
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_feed(sender, instance, **kwargs):
+    user_id, author_id = instance.user_id, instance.author_id
+
+    def update_feeds():
+        remove_author(user_id, author_id)
+        sync_fanout_mode(author_id)
+
+    transaction.on_commit(update_feeds)
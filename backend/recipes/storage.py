@@ -0,0 +1,31 @@
+import hashlib
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранилище, называющее файлы по хэшу содержимого.
+
+    Одинаковые загрузки не объединяются: если файл с таким хэшем уже есть,
+    новый получает имя со случайным суффиксом. Так у каждой загрузки свой
+    файл, и удаление или замена изображения одного рецепта не затронет
+    другой. Ссылаться на один файл могут только рецепты из массовой
+    загрузки, поэтому код приложения файлы изображений не удаляет."""
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest.hexdigest() + extension)
+        try:
+            return super().save(name, content, max_length)
+        finally:
+            if hasattr(content, 'temporary_file_path'):
+                # Временный файл перемещён в хранилище и больше не нужен
+                content.close()
@@ -0,0 +1,78 @@
+import pytest
+from django.core.management import CommandError, call_command
+
+from recipes.models import Favorite, Recipe
+from users.models import User
+
+
+def counters(recipe):
+    return Recipe.objects.values_list(
+        'favorites_count', 'carts_count'
+    ).get(pk=recipe.pk)
+
+
+def user_counters(user):
+    return User.objects.values_list(
+        'recipes_count', 'followers_count'
+    ).get(pk=user.pk)
+
+
+@pytest.mark.django_db
+class TestCounters:
+    def test_favorites_and_carts_are_counted(
+        self, user, make_user, make_recipe, add_to_cart
+    ):
+        other = make_user('other')
+        recipe = make_recipe({})
+        Favorite.objects.create(user=user, recipe=recipe)
+        Favorite.objects.create(user=other, recipe=recipe)
+        cart = add_to_cart(recipe)
+        assert counters(recipe) == (2, 1)
+        Favorite.objects.get(user=other).delete()
+        cart.delete()
+        assert counters(recipe) == (1, 0)
+
+    def test_api_updates_counters(self, user_client, make_recipe):
+        recipe = make_recipe({})
+        url = f'/api/recipes/{recipe.pk}/'
+        assert user_client.post(f'{url}favorite/').status_code == 201
+        assert user_client.post(f'{url}shopping_cart/').status_code == 201
+        assert user_client.post(f'{url}favorite/').status_code == 400
+        assert counters(recipe) == (1, 1)
+        assert user_client.delete(f'{url}favorite/').status_code == 204
+        assert counters(recipe) == (0, 1)
+
+    def test_recipes_and_followers_are_counted(
+        self, user, author, make_recipe, subscribe
+    ):
+        first = make_recipe({})
+        make_recipe({})
+        subscribe(user, author)
+        assert user_counters(author) == (2, 1)
+        first.delete()
+        user.delete()
+        assert user_counters(author) == (1, 0)
+
+    def test_save_does_not_overwrite_counters(
+        self, user, make_recipe, add_to_cart
+    ):
+        recipe = make_recipe({})
+        stale = Recipe.objects.get(pk=recipe.pk)
+        add_to_cart(recipe)
+        stale.name = 'Новое название'
+        stale.save()
+        assert counters(recipe) == (0, 1)
+
+    def test_rebuild_counters_fixes_drift(
+        self, user, author, make_recipe, add_to_cart
+    ):
+        recipe = make_recipe({})
+        add_to_cart(recipe)
+        Recipe.objects.update(carts_count=5)
+        User.objects.filter(pk=author.pk).update(recipes_count=0)
+        with pytest.raises(CommandError):
+            call_command('rebuild_counters', '--verify')
+        call_command('rebuild_counters')
+        call_command('rebuild_counters', '--verify')
+        assert counters(recipe) == (0, 1)
+        assert user_counters(author) == (1, 0)
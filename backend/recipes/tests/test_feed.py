@@ -0,0 +1,83 @@
+import pytest
+
+from recipes.feed import rebuild_feeds
+from recipes.models import FeedEntry
+from users.models import User
+
+FEED_URL = '/api/recipes/feed/'
+
+
+def feed_ids(client, **params):
+    """id рецептов всех страниц ленты по ссылкам next"""
+    ids = []
+    response = client.get(FEED_URL, params)
+    while True:
+        assert response.status_code == 200
+        data = response.json()
+        ids.extend(recipe['id'] for recipe in data['results'])
+        if data['next'] is None:
+            return ids
+        response = client.get(data['next'])
+
+
+def entry_ids(user):
+    return set(FeedEntry.objects.filter(user=user).values_list(
+        'recipe_id', flat=True
+    ))
+
+
+# Ленты обновляются после фиксации транзакции
+@pytest.mark.django_db(transaction=True)
+class TestFeed:
+    def test_new_recipe_is_fanned_out_to_followers(
+        self, user, author, make_user, make_recipe, subscribe, user_client
+    ):
+        subscribe(user, author)
+        stranger = make_user('stranger')
+        recipe = make_recipe({})
+        make_recipe({}, recipe_author=stranger)
+        assert entry_ids(user) == {recipe.pk}
+        assert feed_ids(user_client) == [recipe.pk]
+
+    def test_subscription_backfills_and_unsubscription_clears(
+        self, user, author, make_recipe, subscribe
+    ):
+        recipes = [make_recipe({}) for _ in range(3)]
+        subscription = subscribe(user, author)
+        assert entry_ids(user) == {recipe.pk for recipe in recipes}
+        subscription.delete()
+        assert entry_ids(user) == set()
+
+    def test_feed_pages_newest_first(
+        self, user, author, make_recipe, subscribe, user_client
+    ):
+        subscribe(user, author)
+        recipes = [make_recipe({}) for _ in range(5)]
+        expected = [recipe.pk for recipe in reversed(recipes)]
+        assert feed_ids(user_client, limit=2) == expected
+
+    def test_popular_author_is_merged_on_read(
+        self, settings, user, author, make_user, make_recipe, subscribe,
+        user_client
+    ):
+        settings.FEED_FANOUT_MAX_FOLLOWERS = 1
+        subscribe(user, author)
+        old = make_recipe({})
+        follower = subscribe(make_user('follower'), author)
+        assert User.objects.get(pk=author.pk).feed_fanout_on_read
+        new = make_recipe({})
+        assert new.pk not in entry_ids(user)
+        assert feed_ids(user_client) == [new.pk, old.pk]
+        follower.delete()
+        assert not User.objects.get(pk=author.pk).feed_fanout_on_read
+        assert entry_ids(user) == {old.pk, new.pk}
+        assert feed_ids(user_client) == [new.pk, old.pk]
+
+    def test_rebuild_feeds_restores_entries(
+        self, user, author, make_recipe, subscribe
+    ):
+        subscribe(user, author)
+        recipe = make_recipe({})
+        FeedEntry.objects.all().delete()
+        assert rebuild_feeds() == 1
+        assert entry_ids(user) == {recipe.pk}
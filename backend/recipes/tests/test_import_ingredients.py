@@ -0,0 +1,80 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from recipes.models import Ingredient
+
+
+def ingredients():
+    return list(Ingredient.objects.order_by('id').values_list(
+        'name', 'measurement_unit'
+    ))
+
+
+def import_file(path, *args):
+    call_command('import_csv', str(path), *args, stdout=StringIO())
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text(
+        'name,measurement_unit\n'
+        '  Соус   Tabasco ,мл\n'
+        'мука,г\n'
+        ',г\n'
+        'мука,г\n',
+        encoding='utf-8',
+    )
+    return path
+
+
+@pytest.mark.django_db
+class TestImportIngredients:
+    def test_csv_import_cleans_whitespace_and_skips_blanks(self, csv_file):
+        import_file(csv_file)
+        assert ingredients() == [('Соус Tabasco', 'мл'), ('мука', 'г')]
+
+    def test_repeated_import_creates_nothing(self, csv_file):
+        import_file(csv_file)
+        import_file(csv_file, '--chunked', '--batch-size', '1')
+        assert len(ingredients()) == 2
+
+    def test_case_variants_are_skipped(self, csv_file, tmp_path):
+        import_file(csv_file)
+        variant = tmp_path / 'variant.csv'
+        # SQLite приводит к нижнему регистру только латиницу
+        variant.write_text(
+            'name,measurement_unit\nСоус TABASCO,мл\n', encoding='utf-8'
+        )
+        import_file(variant)
+        assert ingredients() == [('Соус Tabasco', 'мл'), ('мука', 'г')]
+
+    def test_json_is_read_in_chunks(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(
+            'recipes.management.commands.import_csv.READ_SIZE', 7
+        )
+        path = tmp_path / 'ingredients.json'
+        rows = [
+            {'name': f'ингредиент {i}', 'measurement_unit': 'г'}
+            for i in range(10)
+        ]
+        path.write_text(json.dumps(rows, ensure_ascii=False, indent=1))
+        import_file(path)
+        assert len(ingredients()) == 10
+
+    @pytest.mark.parametrize('content', (
+        '{"name": "мука"}', '[{"name": "мука"', '[{"name": 1}]',
+    ))
+    def test_invalid_json_is_rejected(self, tmp_path, content):
+        path = tmp_path / 'ingredients.json'
+        path.write_text(content, encoding='utf-8')
+        with pytest.raises(CommandError):
+            import_file(path)
+        assert not ingredients()
+
+    def test_unknown_extension_is_rejected(self, tmp_path):
+        with pytest.raises(CommandError):
+            import_file(tmp_path / 'ingredients.xml')
@@ -0,0 +1,66 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from recipes.models import FeedEntry, Recipe
+from users.models import User
+
+
+def run(command, *args):
+    call_command(command, *args, stdout=StringIO())
+
+
+def recipe_rows(path):
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+@pytest.mark.django_db
+class TestRecipeExportImport:
+    def test_round_trip_restores_recipes(
+        self, tmp_path, ingredients, make_recipe
+    ):
+        flour, milk, _ = ingredients
+        make_recipe({flour: 200, milk: 100}, name='Блины')
+        make_recipe({flour: 50}, name='Лепёшки')
+        path = tmp_path / 'recipes.ndjson'
+        run('export_recipes', str(path))
+        exported = recipe_rows(path)
+        Recipe.objects.all().delete()
+        run('import_recipes', str(path), '--batch-size', '1')
+        run('export_recipes', str(path))
+        assert recipe_rows(path) == exported
+        assert [row['name'] for row in exported] == ['Блины', 'Лепёшки']
+
+    def test_import_updates_counters_and_feeds(
+        self, tmp_path, user, author, ingredients, make_recipe, subscribe
+    ):
+        make_recipe({ingredients[0]: 1})
+        path = tmp_path / 'recipes.ndjson'
+        run('export_recipes', str(path))
+        Recipe.objects.all().delete()
+        subscribe(user, author)
+        run('import_recipes', str(path))
+        recipe = Recipe.objects.get()
+        assert User.objects.get(pk=author.pk).recipes_count == 1
+        assert list(FeedEntry.objects.filter(user=user).values_list(
+            'recipe_id', flat=True
+        )) == [recipe.pk]
+
+    def test_unknown_reference_rolls_back(
+        self, tmp_path, author, tag, ingredients
+    ):
+        row = {
+            'author': author.email, 'name': 'Рецепт', 'text': 'Описание',
+            'cooking_time': 10, 'tags': [tag.slug], 'ingredients': [],
+        }
+        path = tmp_path / 'recipes.ndjson'
+        path.write_text('\n'.join(
+            json.dumps(data, ensure_ascii=False)
+            for data in (row, {**row, 'author': 'nobody@example.com'})
+        ), encoding='utf-8')
+        with pytest.raises(CommandError, match='Строка 2'):
+            run('import_recipes', str(path), '--batch-size', '1')
+        assert not Recipe.objects.exists()
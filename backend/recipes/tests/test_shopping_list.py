@@ -0,0 +1,69 @@
+import pytest
+
+from recipes.models import Cart, RecipeIngredients, ShoppingListItem
+
+
+def totals(user):
+    return dict(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'amount'
+    ))
+
+
+@pytest.mark.django_db
+class TestShoppingListTotals:
+    def test_cart_sums_amounts_of_recipes(
+        self, user, ingredients, make_recipe, add_to_cart
+    ):
+        flour, milk, eggs = ingredients
+        add_to_cart(make_recipe({flour: 200, milk: 100}))
+        add_to_cart(make_recipe({flour: 50, eggs: 2}))
+        assert totals(user) == {'мука': 250, 'молоко': 100, 'яйца': 2}
+
+    def test_removing_recipe_subtracts_its_amounts(
+        self, user, ingredients, make_recipe, add_to_cart
+    ):
+        flour, milk, _ = ingredients
+        add_to_cart(make_recipe({flour: 200, milk: 100}))
+        cart = add_to_cart(make_recipe({flour: 50}))
+        cart.delete()
+        assert totals(user) == {'мука': 200, 'молоко': 100}
+
+    def test_recipe_change_updates_carts(
+        self, user, make_user, ingredients, make_recipe, add_to_cart
+    ):
+        flour, milk, eggs = ingredients
+        other = make_user('other')
+        recipe = make_recipe({flour: 200, milk: 100})
+        add_to_cart(recipe)
+        add_to_cart(recipe, other)
+        row = RecipeIngredients.objects.get(recipe=recipe, ingredient=flour)
+        row.amount = 300
+        row.save()
+        RecipeIngredients.objects.get(recipe=recipe, ingredient=milk).delete()
+        RecipeIngredients.objects.create(
+            recipe=recipe, ingredient=eggs, amount=3
+        )
+        assert totals(user) == {'мука': 300, 'яйца': 3}
+        assert totals(other) == {'мука': 300, 'яйца': 3}
+
+    def test_recipe_deletion_clears_its_amounts(
+        self, user, ingredients, make_recipe, add_to_cart
+    ):
+        flour, milk, _ = ingredients
+        recipe = make_recipe({flour: 200, milk: 100})
+        add_to_cart(recipe)
+        add_to_cart(make_recipe({flour: 50}))
+        recipe.delete()
+        assert not Cart.objects.filter(recipe_id=recipe.pk).exists()
+        assert totals(user) == {'мука': 50}
+
+    def test_refresh_matches_cart(
+        self, user, ingredients, make_recipe, add_to_cart
+    ):
+        flour, milk, _ = ingredients
+        add_to_cart(make_recipe({flour: 200, milk: 100}))
+        add_to_cart(make_recipe({flour: 50}))
+        expected = totals(user)
+        ShoppingListItem.objects.filter(user=user).delete()
+        ShoppingListItem.objects.refresh([user.pk])
+        assert totals(user) == expected
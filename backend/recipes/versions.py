@@ -0,0 +1,95 @@
+import time
+
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_KEY_PREFIX = 'version'
+
+INGREDIENTS = 'ingredients'
+RECIPES = 'recipes'
+SHOPPING_LIST = 'shopping_list'
+TAGS = 'tags'
+USER_RELATIONS = 'user_relations'
+USERS = 'users'
+
+
+def is_cache_shared() -> bool:
+    """Видна ли смена версии всем процессам. Кэш в памяти процесса версии
+    не разделяет: сброс командой manage.py не дойдёт до веб-сервера"""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def check_cache_shared(app_configs, **kwargs):
+    if is_cache_shared():
+        return []
+    return [checks.Warning(
+        'Кэш по умолчанию не общий для процессов, кэширование ответов '
+        'отключено, а индексы в памяти не узнают об изменениях из других '
+        'процессов',
+        hint='Укажите общий кэш в CACHE_BACKEND, например FileBasedCache',
+        id='recipes.W001',
+    )]
+
+
+def _now() -> int:
+    return int(time.time() * 1000)
+
+
+def version_key(name: str, *parts) -> str:
+    return ':'.join(str(part) for part in (VERSION_KEY_PREFIX, name) + parts)
+
+
+def get_version(name: str, *parts) -> int:
+    """Текущая версия данных, общая для всех процессов через кэш.
+
+    Версия - отметка времени в миллисекундах, поэтому потерянная при
+    вытеснении из кэша версия заменяется новой, а не повторяет старую."""
+    key = version_key(name, *parts)
+    version = cache.get(key)
+    if version is None:
+        version = _now()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def get_versions(*names: str) -> tuple:
+    """Текущие версии нескольких наборов данных одним обращением к кэшу"""
+    keys = [version_key(name) for name in names]
+    versions = cache.get_many(keys)
+    if len(versions) < len(keys):
+        return tuple(get_version(name) for name in names)
+    return tuple(versions[key] for key in keys)
+
+
+def _bump(keys) -> None:
+    if not keys:
+        return
+    now = _now()
+    current = cache.get_many(keys)
+    cache.set_many(
+        {key: max(now, current.get(key, 0) + 1) for key in keys}, None
+    )
+
+
+def bump_version(name: str, *parts) -> None:
+    """Смена версии данных, сбрасывающая все зависящие от неё кэши"""
+    _bump([version_key(name, *parts)])
+
+
+def bump_versions(name: str, ids) -> None:
+    """Смена версий данных name для каждого из ids"""
+    _bump([version_key(name, id_) for id_ in ids])
+
+
+def bump_version_on_commit(name: str, *parts) -> None:
+    """Смена версии после фиксации транзакции, чтобы конкурентный запрос
+    не закэшировал под новой версией ещё не зафиксированные данные"""
+    transaction.on_commit(lambda: bump_version(name, *parts))
+
+
+def bump_versions_on_commit(name: str, ids) -> None:
+    ids = list(ids)
+    transaction.on_commit(lambda: bump_versions(name, ids))
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_fanout_on_read(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    User.objects.filter(
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).update(feed_fanout_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_fanout_on_read',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Лента подписчиков собирается при чтении'),
+        ),
+        migrations.RunPython(mark_fanout_on_read, migrations.RunPython.noop),
+    ]
@@ -2,13 +2,33 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Счётчики и флаги в COUNTER_FIELDS меняются только атомарными
+    обновлениями. Обычное сохранение изменённого объекта их не записывает,
+    чтобы не затереть устаревшим значением из памяти."""
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Модель для учетных записей пользователей"""
     USER = 'user'
     ADMIN = 'admin'
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name', 'password',)
 
+    COUNTER_FIELDS = (
+        'recipes_count', 'followers_count', 'feed_fanout_on_read',
+    )
+
     ROLE_CHOICES = [
         (USER, USER),
         (ADMIN, ADMIN),
@@ -41,6 +61,23 @@ class User(AbstractUser):
         max_length=150,
         blank=False,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False,
+    )
+    # Рецепты автора с числом подписчиков больше FEED_FANOUT_MAX_FOLLOWERS
+    # не раскладываются по лентам, а добавляются в ленту при чтении
+    feed_fanout_on_read = models.BooleanField(
+        verbose_name='Лента подписчиков собирается при чтении',
+        default=False,
+        editable=False,
+    )
 
     @property
     def is_user(self):
@@ -54,6 +91,19 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('id',)
+        # Поиск по началу строки в админке, LIKE 'текст%' в PostgreSQL
+        indexes = (
+            models.Index(
+                fields=('email',),
+                name='user_email_prefix_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+            models.Index(
+                fields=('username',),
+                name='user_username_prefix_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        )
 
     def __str__(self):
         return self.username